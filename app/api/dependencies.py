@@ -1,13 +1,22 @@
+from collections.abc import Callable
 from uuid import UUID
-from app.database.models import DeliveryPartner, Seller
-from app.database.redis import is_jti_blacklisted
+from app.database.loading import LoadProfile, load_options
+from app.database.models import DeliveryPartner, Seller, User
+from app.core.principal_cache import Principal, principal_cache
+from app.core.rate_limit import rate_limiter
+from app.core.token_revocation import revoked_tokens
 from app.services.delivery_partner import DeliveryPartnerService
+from app.services.notification import NotificationService
 from app.services.seller import SellerService
 from app.services.shipment import ShipmentService
 from typing import Annotated
-from fastapi import BackgroundTasks, Depends, status, HTTPException
+from fastapi import Depends, Request, status, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database.session import get_session
+from app.database.replicas import PRIMARY_COOKIE, replicas
+from app.database.session import async_session, get_session
+from app.database.unit_of_work import UnitOfWork
 from app.core.security import oauth2_scheme_seller, oauth2_scheme_partner
 from app.services.shipment_event import ShipmentEventService
 from app.utils.jwt_token import decode_access_token
@@ -17,13 +26,17 @@ SessionDep = Annotated[AsyncSession, Depends(get_session)]
 
 # Access token data dep
 async def _get_access_token(token: str) -> dict:
-    data = decode_access_token(token)
+    entry = principal_cache.get(token)
+    data = entry.claims if entry else decode_access_token(token)
 
-    if data is None or await is_jti_blacklisted(data["jti"]):
+    if data is None or await revoked_tokens.is_revoked(data["jti"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token"
         )
 
+    if entry is None:
+        principal_cache.add(token, data)
+
     return data
 
 
@@ -39,56 +52,157 @@ async def get_partner_access_token(
     return await _get_access_token(token)
 
 
-async def get_current_seller(
-    token_data: Annotated[dict, Depends(get_seller_access_token)],
-    session: SessionDep,
-):
-    seller = await session.get(Seller, UUID(token_data["user"]["id"]))
+async def _get_principal(
+    token: str, token_data: dict, model: type[User], session: AsyncSession
+) -> Principal:
+    entry = principal_cache.get(token)
+
+    if entry is not None and entry.principal is not None:
+        if entry.principal.kind != model.__tablename__:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized"
+            )
+        return entry.principal
 
-    if seller is None:
+    user = await session.get(
+        model,
+        UUID(token_data["user"]["id"]),
+        options=load_options(LoadProfile.principal_only),
+    )
+
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized"
         )
 
-    return seller
+    principal = Principal.from_user(user)
+
+    if entry is not None:
+        entry.principal = principal
+
+    return principal
+
+
+async def get_current_seller(
+    token: Annotated[str, Depends(oauth2_scheme_seller)],
+    token_data: Annotated[dict, Depends(get_seller_access_token)],
+    session: SessionDep,
+):
+    return await _get_principal(token, token_data, Seller, session)
 
 
 async def get_current_partner(
+    token: Annotated[str, Depends(oauth2_scheme_partner)],
     token_data: Annotated[dict, Depends(get_partner_access_token)],
     session: SessionDep,
 ):
-    partner = await session.get(DeliveryPartner, UUID(token_data["user"]["id"]))
+    return await _get_principal(token, token_data, DeliveryPartner, session)
 
-    if partner is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized"
-        )
 
-    return partner
+# One unit of work per request, shared by every service below
+def get_unit_of_work(session: SessionDep):
+    return UnitOfWork(session)
+
+
+UnitOfWorkDep = Annotated[UnitOfWork, Depends(get_unit_of_work)]
+
+
+# Read-only endpoints go to a healthy replica, unless this client wrote
+# recently and must read its own writes
+async def get_read_unit_of_work(request: Request):
+    factory = None
+
+    if PRIMARY_COOKIE not in request.cookies:
+        factory = replicas.session_factory()
 
+    if factory is None:
+        uow = UnitOfWork(async_session())
+    else:
+        uow = UnitOfWork(factory(), primary=async_session)
 
-def get_shipment_service(session: SessionDep, tasks: BackgroundTasks):
+    try:
+        yield uow
+    finally:
+        await uow.close()
+
+
+ReadUnitOfWorkDep = Annotated[UnitOfWork, Depends(get_read_unit_of_work)]
+
+
+# Queues into the request's unit of work, sending is left to the outbox worker
+def get_notification_service(uow: UnitOfWorkDep):
+    return NotificationService(uow)
+
+
+NotificationServiceDep = Annotated[
+    NotificationService, Depends(get_notification_service)
+]
+
+
+def get_shipment_service(uow: UnitOfWorkDep, notifications: NotificationServiceDep):
     return ShipmentService(
-        session, DeliveryPartnerService(session, tasks), ShipmentEventService(session, tasks)
+        uow,
+        DeliveryPartnerService(uow, notifications),
+        ShipmentEventService(uow, notifications),
     )
 
 
-def get_seller_service(session: SessionDep, tasks: BackgroundTasks):
-    return SellerService(session, tasks)
+def get_read_shipment_service(uow: ReadUnitOfWorkDep):
+    return get_shipment_service(uow, NotificationService(uow))
+
 
+def get_seller_service(uow: UnitOfWorkDep, notifications: NotificationServiceDep):
+    return SellerService(uow, notifications)
 
-def get_delivery_partner_service(session: SessionDep, tasks: BackgroundTasks):
-    return DeliveryPartnerService(session, tasks)
+
+def get_delivery_partner_service(
+    uow: UnitOfWorkDep, notifications: NotificationServiceDep
+):
+    return DeliveryPartnerService(uow, notifications)
 
 
-SellerDep = Annotated[Seller, Depends(get_current_seller)]
+SellerDep = Annotated[Principal, Depends(get_current_seller)]
 
-DeliveryPartnerDep = Annotated[DeliveryPartner, Depends(get_current_partner)]
+DeliveryPartnerDep = Annotated[Principal, Depends(get_current_partner)]
 
 ShipmentServiceDep = Annotated[ShipmentService, Depends(get_shipment_service)]
 
+ReadShipmentServiceDep = Annotated[
+    ShipmentService, Depends(get_read_shipment_service)
+]
+
 SellerServiceDep = Annotated[SellerService, Depends(get_seller_service)]
 
 DeliveryPartnerServiceDep = Annotated[
     DeliveryPartnerService, Depends(get_delivery_partner_service)
 ]
+
+
+def _no_account() -> None:
+    return None
+
+
+def rate_limited(route: str, account: Callable[..., str | None] = _no_account):
+    """Admits the request under the RATE_LIMITS of `route`. `account` is a
+    dependency returning the account the request acts on."""
+
+    async def check(
+        request: Request, account_id: Annotated[str | None, Depends(account)]
+    ):
+        client = request.client.host if request.client else None
+        await rate_limiter.check(route, client, account_id)
+
+    return Depends(check)
+
+
+# Accounts for rate_limited, resolved from what the route itself reads
+def login_account(form: Annotated[OAuth2PasswordRequestForm, Depends()]) -> str:
+    return form.username.lower()
+
+
+def email_account(email: EmailStr) -> str:
+    return email.lower()
+
+
+def seller_account(seller: SellerDep) -> str:
+    return str(seller.id)
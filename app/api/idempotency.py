@@ -0,0 +1,95 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from hashlib import blake2b
+from time import monotonic
+from typing import Annotated
+
+import orjson
+from fastapi import Header, HTTPException, Response, status
+
+from app.config.config import app_settings
+from app.database.redis import (
+    claim_idempotency_key,
+    release_idempotency_key,
+    save_idempotency_record,
+)
+
+IdempotencyKey = Annotated[str | None, Header(alias="Idempotency-Key", max_length=255)]
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# How often a retry checks on the request it is waiting for
+_POLL_INTERVAL = 0.05
+
+
+async def idempotent(
+    key: str | None,
+    scope: str,
+    request: bytes,
+    handler: Callable[[], Awaitable[Response]],
+) -> Response:
+    """Runs `handler` once per key within `scope`, retries get its response.
+
+    `request` is what was asked for, a key sent again with a different one is
+    rejected. Only successful responses are kept, a failed request rolled
+    back and its retry runs again.
+    """
+    if key is None:
+        return await handler()
+
+    redis_key = f"idempotency:{scope}:{key}"
+    fingerprint = blake2b(request, digest_size=16).hexdigest()
+    in_flight = orjson.dumps({"fingerprint": fingerprint})
+    deadline = monotonic() + app_settings.IDEMPOTENCY_LOCK_TTL
+
+    while (
+        record := await claim_idempotency_key(
+            redis_key, in_flight, app_settings.IDEMPOTENCY_LOCK_TTL
+        )
+    ) is not None:
+        stored = orjson.loads(record)
+
+        if stored["fingerprint"] != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="Idempotency-Key was already used for a different request",
+            )
+
+        if "status_code" in stored:
+            return Response(
+                content=stored["body"],
+                status_code=stored["status_code"],
+                media_type=stored["media_type"],
+                headers={REPLAYED_HEADER: "true"},
+            )
+
+        if monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress",
+            )
+
+        # Until the first request stores its response, or gives the key up
+        await asyncio.sleep(_POLL_INTERVAL)
+
+    try:
+        response = await handler()
+    except BaseException:
+        await release_idempotency_key(redis_key)
+        raise
+
+    if response.status_code >= 400:
+        await release_idempotency_key(redis_key)
+        return response
+
+    await save_idempotency_record(
+        redis_key,
+        orjson.dumps({
+            "fingerprint": fingerprint,
+            "status_code": response.status_code,
+            "media_type": response.media_type,
+            "body": response.body.decode(),
+        }),
+        app_settings.IDEMPOTENCY_TTL,
+    )
+    return response
@@ -0,0 +1,112 @@
+import logging
+from time import perf_counter
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import REQUEST_COMPONENT_DURATION, REQUEST_DURATION, track_request
+from app.database.query_stats import QueryBudgetExceeded, track_queries
+from app.database.replicas import PRIMARY_COOKIE, track_writes
+
+logger = logging.getLogger(__name__)
+
+
+class PrimaryStickinessMiddleware:
+    """Sets a short-lived cookie on responses to requests that committed a
+    write, so that client's next reads see it by going to the primary."""
+
+    def __init__(self, app: ASGIApp, seconds: int):
+        self.app = app
+        self.cookie = f"{PRIMARY_COOKIE}=1; Max-Age={seconds}; Path=/; HttpOnly; SameSite=Lax"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        writes = track_writes()
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start" and writes["written"]:
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+class MetricsMiddleware:
+    """Records the latency of every request by route template, along with
+    how much of it went to the database, Redis, templates and hashing."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = track_request()
+        status_code = 500
+        start = perf_counter()
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - start
+            method = scope["method"]
+            # Set by the router on match, keeps ids out of the label values
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+
+            REQUEST_DURATION.labels(method, path, status_code).observe(elapsed)
+            for component, seconds in timings.items():
+                REQUEST_COMPONENT_DURATION.labels(method, path, component).observe(seconds)
+
+
+class QueryStatsMiddleware:
+    """Counts the statements and rows of every request. Reports them as
+    headers and a log line, and checks them against the route's
+    query_budget, raising QueryBudgetExceeded when `enforce_budgets`."""
+
+    def __init__(self, app: ASGIApp, headers: bool, enforce_budgets: bool):
+        self.app = app
+        self.headers = headers
+        self.enforce_budgets = enforce_budgets
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = track_queries()
+
+        async def send_with_stats(message: Message):
+            if message["type"] == "http.response.start" and self.headers:
+                headers = MutableHeaders(scope=message)
+                headers.append("x-query-count", str(stats.statements))
+                headers.append("x-query-rows", str(stats.rows))
+            await send(message)
+
+        await self.app(scope, receive, send_with_stats)
+
+        route = scope.get("route")
+        path = route.path if route is not None else scope["path"]
+
+        if self.headers:
+            logger.info(
+                "%s %s: %d statements, %d rows",
+                scope["method"], path, stats.statements, stats.rows,
+            )
+
+        budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        if budget is not None and stats.statements > budget:
+            message = (
+                f"{scope['method']} {path} ran {stats.statements} statements, "
+                f"its budget is {budget}"
+            )
+            if self.enforce_budgets:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
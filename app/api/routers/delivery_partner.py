@@ -1,20 +1,30 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
-from app.api.dependencies import DeliveryPartnerDep, DeliveryPartnerServiceDep, get_partner_access_token
+from app.api.dependencies import DeliveryPartnerDep, DeliveryPartnerServiceDep, ReadShipmentServiceDep, get_partner_access_token, login_account, rate_limited
 from app.api.schemas.delivery_partner import DeliveryPartnerCreate, DeliveryPartnerRead, DeliveryPartnerUpdate
-from app.database.redis import add_jti_to_blacklist
+from app.api.schemas.shipment import ShipmentListQuery, ShipmentPage
+from app.core.principal_cache import principal_cache
+from app.core.security import oauth2_scheme_partner
+from app.core.token_revocation import revoked_tokens
+from app.database.query_stats import query_budget
 
 router = APIRouter(
     prefix="/partner",
     tags=["Delivery Partner"]
 )
 
-@router.post("/signup", response_model=DeliveryPartnerRead)
+@router.post(
+    "/signup",
+    response_model=DeliveryPartnerRead,
+    dependencies=[rate_limited("partner-signup")],
+)
 async def register_delivery_partner(delivery_partner: DeliveryPartnerCreate, service: DeliveryPartnerServiceDep):
     return await service.add(delivery_partner)
 
-@router.post("/token")
+@router.post(
+    "/token", dependencies=[rate_limited("partner-token", account=login_account)]
+)
 async def login_delivery_partner(
     request_form: Annotated[OAuth2PasswordRequestForm, Depends()],
     service: DeliveryPartnerServiceDep
@@ -26,8 +36,12 @@ async def login_delivery_partner(
     }
 
 @router.get("/logout")
-async def logout_user(token_data: Annotated[dict, Depends(get_partner_access_token)]):
-    await add_jti_to_blacklist(token_data["jti"])
+async def logout_user(
+    token: Annotated[str, Depends(oauth2_scheme_partner)],
+    token_data: Annotated[dict, Depends(get_partner_access_token)]
+):
+    await revoked_tokens.revoke(token_data["jti"], token_data["exp"])
+    principal_cache.discard(token)
     return {
         "detail": "Successfully logged out"
     }
@@ -46,9 +60,17 @@ async def update_delivery_partner(
             detail="No data provided to update"
         )
 
-    return await service.update(
-        partner.sqlmodel_update(update)
-    )
+    return await service.update(partner.id, update)
+
+@router.get("/shipments", response_model=ShipmentPage)
+@query_budget(2)
+async def list_partner_shipments(
+    query: Annotated[ShipmentListQuery, Query()],
+    partner: DeliveryPartnerDep,
+    service: ReadShipmentServiceDep
+):
+    shipments, next_cursor = await service.list_for_partner(partner, query)
+    return ShipmentPage(items=shipments, next_cursor=next_cursor)
 
 @router.get("/verify")
 async def verify_partner_email(token: str, service: DeliveryPartnerServiceDep):
@@ -1,23 +1,40 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, Form, Request
+from fastapi import APIRouter, Depends, Form, Query, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.templating import Jinja2Templates
 from pydantic import EmailStr
-from app.api.dependencies import SellerServiceDep, get_seller_access_token
+from app.api.dependencies import (
+    SellerDep,
+    SellerServiceDep,
+    ReadShipmentServiceDep,
+    email_account,
+    get_seller_access_token,
+    login_account,
+    rate_limited,
+)
 from app.api.schemas.seller import SellerCreate, SellerRead
-from app.database.redis import add_jti_to_blacklist
-from app.utils.email_util import TEMPLATE_DIR
+from app.api.schemas.shipment import ShipmentListQuery, ShipmentPage
+from app.core.principal_cache import principal_cache
+from app.core.security import oauth2_scheme_seller
+from app.core.token_revocation import revoked_tokens
+from app.database.query_stats import query_budget
+from app.utils.templates import templates
 from app.config.config import app_settings
 
 router = APIRouter(prefix="/seller", tags=["Seller"])
 
 
-@router.post("/signup", response_model=SellerRead)
+@router.post(
+    "/signup",
+    response_model=SellerRead,
+    dependencies=[rate_limited("seller-signup")],
+)
 async def register_seller(seller: SellerCreate, service: SellerServiceDep):
     return await service.add(seller)
 
 
-@router.post("/token")
+@router.post(
+    "/token", dependencies=[rate_limited("seller-token", account=login_account)]
+)
 async def login_seller(
     request_form: Annotated[OAuth2PasswordRequestForm, Depends()],
     service: SellerServiceDep,
@@ -27,18 +44,36 @@ async def login_seller(
 
 
 @router.get("/logout")
-async def logout_user(token_data: Annotated[dict, Depends(get_seller_access_token)]):
-    await add_jti_to_blacklist(token_data["jti"])
+async def logout_user(
+    token: Annotated[str, Depends(oauth2_scheme_seller)],
+    token_data: Annotated[dict, Depends(get_seller_access_token)],
+):
+    await revoked_tokens.revoke(token_data["jti"], token_data["exp"])
+    principal_cache.discard(token)
     return {"detail": "Successfully logged out"}
 
 
+@router.get("/shipments", response_model=ShipmentPage)
+@query_budget(2)
+async def list_seller_shipments(
+    query: Annotated[ShipmentListQuery, Query()],
+    seller: SellerDep,
+    service: ReadShipmentServiceDep,
+):
+    shipments, next_cursor = await service.list_for_seller(seller, query)
+    return ShipmentPage(items=shipments, next_cursor=next_cursor)
+
+
 @router.get("/verify")
 async def verify_seller_email(token: str, service: SellerServiceDep):
     await service.verify_email(token)
     return {"detail": "Account verified."}
 
 
-@router.get("/forgot_password")
+@router.get(
+    "/forgot_password",
+    dependencies=[rate_limited("seller-forgot-password", account=email_account)],
+)
 async def forgot_password(email: EmailStr, service: SellerServiceDep):
     await service.send_password_reset_link(email, router.prefix)
     return {"detail": "Check email for password reset link"}
@@ -46,8 +81,6 @@ async def forgot_password(email: EmailStr, service: SellerServiceDep):
 
 @router.get("/reset_password_form")
 async def get_reset_password_form(request: Request, token: str):
-    templates = Jinja2Templates(TEMPLATE_DIR)
-
     return templates.TemplateResponse(
         request=request,
         name="mail_reset_password_form.html",
@@ -66,8 +99,6 @@ async def reset_password(
 ):
     is_success = await service.reset_password(token, password)
 
-    templates = Jinja2Templates(TEMPLATE_DIR)
-
     if is_success:
         return templates.TemplateResponse(
             request=request, 
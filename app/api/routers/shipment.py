@@ -1,35 +1,98 @@
+from typing import Annotated
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, Request, status
-from fastapi.templating import Jinja2Templates
-from app.api.dependencies import DeliveryPartnerDep, SellerDep, ShipmentServiceDep
-from app.api.schemas.shipment import ShipmentCreate, ShipmentRead, ShipmentUpdate
-from app.utils.email_util import TEMPLATE_DIR
+import orjson
+from fastapi import (
+    APIRouter,
+    Body,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from app.api.dependencies import (
+    DeliveryPartnerDep,
+    ReadShipmentServiceDep,
+    SellerDep,
+    ShipmentServiceDep,
+    rate_limited,
+    seller_account,
+)
+from app.api.idempotency import IdempotencyKey, idempotent
+from app.api.schemas.shipment import (
+    ShipmentBatchResult,
+    ShipmentCreate,
+    ShipmentRead,
+    ShipmentUpdate,
+    ShipmentView,
+)
+from app.database.query_stats import query_budget
+from app.services.shipment_stream import StreamState, shipment_streams
+from app.utils.templates import templates
 
 router = APIRouter(
     prefix="/shipment",
     tags=["Shipment"],
+    default_response_class=ORJSONResponse,
 )
 
-templates = Jinja2Templates(
-    TEMPLATE_DIR
-)
+async def _check_not_modified(
+    request: Request, id: UUID, service: ReadShipmentServiceDep
+):
+    validator = await service.get_validator(id)
+
+    if validator is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Shipment not found"
+        )
+
+    # Unchanged shipments are answered before loading the timeline
+    if validator.matches(request):
+        return validator, Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=validator.headers
+        )
+
+    return validator, None
+
+
+# Shipment reads skip response model validation, the views are serialized
+# directly by orjson. ShipmentRead documents the same shape.
+def _shipment_response(
+    shipment: ShipmentView, status_code: int = status.HTTP_200_OK, headers=None
+) -> ORJSONResponse:
+    return ORJSONResponse(shipment, status_code=status_code, headers=headers)
 
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=ShipmentRead)
-async def get_shipment(id: UUID, service: ShipmentServiceDep):
-    shipment = await service.get(id)
+@query_budget(2)
+async def get_shipment(request: Request, id: UUID, service: ReadShipmentServiceDep):
+    validator, not_modified = await _check_not_modified(request, id, service)
+
+    if not_modified is not None:
+        return not_modified
+
+    shipment = await service.get_view(id)
 
     if shipment is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Shipment not found"
         )
 
-    return shipment
+    return _shipment_response(shipment, headers=validator.headers)
 
 
 ### Tracking details of shipment
 @router.get("/track")
-async def get_tracking(request: Request, id: UUID, service: ShipmentServiceDep):
+@query_budget(3)
+async def get_tracking(request: Request, id: UUID, service: ReadShipmentServiceDep):
+    validator, not_modified = await _check_not_modified(request, id, service)
+
+    if not_modified is not None:
+        return not_modified
+
     shipment = await service.get(id)
 
     context = shipment.model_dump()
@@ -41,14 +104,57 @@ async def get_tracking(request: Request, id: UUID, service: ShipmentServiceDep):
     return templates.TemplateResponse(
         request=request,
         name="track.html",
-        context=context
+        context=context,
+        headers=validator.headers,
     )
 
-@router.post("/", status_code=status.HTTP_201_CREATED, response_model=ShipmentRead)
+@router.post(
+    "/",
+    status_code=status.HTTP_201_CREATED,
+    response_model=ShipmentRead,
+    dependencies=[rate_limited("submit-shipment", account=seller_account)],
+)
 async def submit_shipment(
-    shipment: ShipmentCreate, service: ShipmentServiceDep, seller: SellerDep
+    shipment: ShipmentCreate,
+    service: ShipmentServiceDep,
+    seller: SellerDep,
+    idempotency_key: IdempotencyKey = None,
 ):
-    return await service.add(shipment, seller)
+    async def create():
+        return _shipment_response(
+            ShipmentView.from_shipment(await service.add(shipment, seller)),
+            status_code=status.HTTP_201_CREATED,
+        )
+
+    return await idempotent(
+        idempotency_key,
+        scope=f"seller:{seller.id}:submit-shipment",
+        request=shipment.model_dump_json().encode(),
+        handler=create,
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=ShipmentBatchResult,
+    dependencies=[rate_limited("submit-shipment-batch", account=seller_account)],
+)
+async def submit_shipment_batch(
+    shipments: Annotated[list[ShipmentCreate], Body(min_length=1, max_length=1000)],
+    service: ShipmentServiceDep,
+    seller: SellerDep,
+    idempotency_key: IdempotencyKey = None,
+):
+    async def create():
+        result = await service.add_many(shipments, seller)
+        return ORJSONResponse(result.model_dump())
+
+    return await idempotent(
+        idempotency_key,
+        scope=f"seller:{seller.id}:submit-shipment-batch",
+        request=orjson.dumps([shipment.model_dump() for shipment in shipments]),
+        handler=create,
+    )
 
 
 @router.patch("/", response_model=ShipmentRead)
@@ -57,6 +163,7 @@ async def update_shipment(
     shipment_update: ShipmentUpdate,
     service: ShipmentServiceDep,
     partner: DeliveryPartnerDep,
+    idempotency_key: IdempotencyKey = None,
 ):
     update = shipment_update.model_dump(exclude_none=True)
 
@@ -65,11 +172,98 @@ async def update_shipment(
             status_code=status.HTTP_400_BAD_REQUEST, detail="No data provided to update"
         )
 
-    return await service.update(id, shipment_update, partner)
+    async def apply():
+        return _shipment_response(
+            ShipmentView.from_shipment(
+                await service.update(id, shipment_update, partner)
+            )
+        )
+
+    return await idempotent(
+        idempotency_key,
+        scope=f"partner:{partner.id}:update-shipment",
+        request=f"{id}:{shipment_update.model_dump_json()}".encode(),
+        handler=apply,
+    )
 
 
 @router.get("/cancel", response_model=ShipmentRead)
 async def cancel_shipment(
     id: UUID, seller: SellerDep, service: ShipmentServiceDep
 ) -> dict[str, str]:
-    return await service.cancel(id, seller)
+    return _shipment_response(
+        ShipmentView.from_shipment(await service.cancel(id, seller))
+    )
+
+
+def _parse_event_id(value: str | None) -> UUID | None:
+    try:
+        return UUID(value) if value else None
+    except ValueError:
+        return None
+
+
+### Live timeline events, as Server-Sent Events
+@router.get("/{id}/stream")
+async def stream_shipment(
+    id: UUID, last_event_id: Annotated[str | None, Header()] = None
+):
+    after = _parse_event_id(last_event_id)
+    state = await shipment_streams.state(id, after)
+
+    if state is StreamState.missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Shipment not found"
+        )
+
+    # The stream closes after the terminal event, a 204 keeps EventSource
+    # from reconnecting
+    if state is StreamState.finished:
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+    async def events():
+        yield "retry: 3000\n\n"
+
+        async for event in shipment_streams.follow(id, after):
+            if event is None:
+                yield ": heartbeat\n\n"
+            else:
+                yield f"id: {event.id}\nevent: shipment_event\ndata: {event.data}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+### Same stream over a WebSocket, resumed with ?last_event_id=
+@router.websocket("/{id}/stream")
+async def stream_shipment_ws(
+    websocket: WebSocket, id: UUID, last_event_id: str | None = None
+):
+    after = _parse_event_id(last_event_id)
+    state = await shipment_streams.state(id, after)
+
+    if state is StreamState.missing:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Shipment not found")
+        return
+
+    await websocket.accept()
+
+    if state is StreamState.finished:
+        await websocket.close(reason="Shipment is final")
+        return
+
+    try:
+        async for event in shipment_streams.follow(id, after):
+            if event is None:
+                await websocket.send_text('{"type":"heartbeat"}')
+            else:
+                await websocket.send_text(
+                    f'{{"type":"shipment_event","id":"{event.id}","data":{event.data}}}'
+                )
+    except WebSocketDisconnect:
+        return
+
+    await websocket.close()
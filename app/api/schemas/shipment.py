@@ -1,6 +1,7 @@
+from dataclasses import dataclass
 from uuid import UUID
-from pydantic import BaseModel, EmailStr, Field
-from app.database.models import ShipmentEvent, ShipmentStatus
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from app.database.models import Shipment, ShipmentEvent, ShipmentStatus
 from datetime import datetime
 
 class BaseShipment(BaseModel):
@@ -14,6 +15,59 @@ class ShipmentRead(BaseShipment):
     estimated_delivery: datetime
 
 
+# Read DTOs for the hot read path. Built positionally from the row tuples of
+# the columns below and serialized by orjson as is, ShipmentRead stays as the
+# documented response model.
+@dataclass(slots=True)
+class ShipmentEventView:
+    id: UUID
+    created_at: datetime
+    location: int
+    status: ShipmentStatus
+    description: str | None
+    shipment_id: UUID
+
+    columns = (
+        ShipmentEvent.id,
+        ShipmentEvent.created_at,
+        ShipmentEvent.location,
+        ShipmentEvent.status,
+        ShipmentEvent.description,
+        ShipmentEvent.shipment_id,
+    )
+
+    @classmethod
+    def from_event(cls, event: ShipmentEvent) -> "ShipmentEventView":
+        return cls(*(getattr(event, column.key) for column in cls.columns))
+
+@dataclass(slots=True)
+class ShipmentView:
+    id: UUID
+    content: str
+    weight: float
+    destination: int
+    estimated_delivery: datetime
+    timeline: list[ShipmentEventView]
+
+    columns = (
+        Shipment.id,
+        Shipment.content,
+        Shipment.weight,
+        Shipment.destination,
+        Shipment.estimated_delivery,
+    )
+
+    @classmethod
+    def from_rows(cls, shipment: tuple, events: list[tuple]) -> "ShipmentView":
+        return cls(*shipment, [ShipmentEventView(*event) for event in events])
+
+    @classmethod
+    def from_shipment(cls, shipment: Shipment) -> "ShipmentView":
+        return cls(
+            *(getattr(shipment, column.key) for column in cls.columns),
+            [ShipmentEventView.from_event(event) for event in shipment.timeline],
+        )
+
 class ShipmentCreate(BaseShipment):
     client_contact_email: EmailStr
     client_contact_phone: str | None = Field(default=None)
@@ -24,3 +78,32 @@ class ShipmentUpdate(BaseModel):
     verification_code : str | None = Field(default=None)
     estimated_delivery: datetime | None = Field(default=None)
     description: str | None = Field(default=None)
+
+class ShipmentSummary(BaseShipment):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    status: ShipmentStatus | None
+    estimated_delivery: datetime
+    created_at: datetime
+
+class ShipmentPage(BaseModel):
+    items: list[ShipmentSummary]
+    next_cursor: str | None
+
+class ShipmentListQuery(BaseModel):
+    status: ShipmentStatus | None = Field(default=None)
+    created_after: datetime | None = Field(default=None)
+    created_before: datetime | None = Field(default=None)
+    cursor: str | None = Field(default=None)
+    limit: int = Field(default=20, ge=1, le=100)
+
+class ShipmentBatchItem(BaseModel):
+    index: int
+    id: UUID | None = Field(default=None)
+    error: str | None = Field(default=None)
+
+class ShipmentBatchResult(BaseModel):
+    created: int
+    failed: int
+    results: list[ShipmentBatchItem]
@@ -1,4 +1,6 @@
-from pydantic import EmailStr
+from pathlib import Path
+from tempfile import gettempdir
+from pydantic import BaseModel, EmailStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 _base_config = SettingsConfigDict(
@@ -11,6 +13,20 @@ class AppSettings(BaseSettings):
     APP_NAME: str = "FastShip"
     APP_DOMAIN: str = "localhost:8000"
 
+    # Compiled Jinja bytecode, shared by workers and kept across restarts
+    TEMPLATE_CACHE_DIR: Path = Path(gettempdir()) / "fastship-templates"
+
+    # Live shipment streams: seconds between heartbeats and events buffered
+    # per client before it is resynced from the database
+    SHIPMENT_STREAM_HEARTBEAT: float = 15
+    SHIPMENT_STREAM_BUFFER: int = 100
+
+    # Responses to writes sent with an Idempotency-Key are replayed to
+    # retries for IDEMPOTENCY_TTL seconds. A retry arriving while the first
+    # request still runs waits up to IDEMPOTENCY_LOCK_TTL seconds for it.
+    IDEMPOTENCY_TTL: int = 24 * 3600
+    IDEMPOTENCY_LOCK_TTL: int = 30
+
 class DatabaseSettings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
@@ -18,8 +34,42 @@ class DatabaseSettings(BaseSettings):
     POSTGRES_SERVER: str
     POSTGRES_PORT: int
 
+    # Connection pool, sized per worker process
+    POSTGRES_POOL_SIZE: int = 5
+    POSTGRES_MAX_OVERFLOW: int = 10
+    POSTGRES_POOL_TIMEOUT: float = 30
+    POSTGRES_POOL_RECYCLE: int = 1800
+    POSTGRES_POOL_PRE_PING: bool = True
+    # psycopg prepares a statement after this many executions, unset to
+    # disable server-side prepared statements (e.g. behind PgBouncer)
+    POSTGRES_PREPARE_THRESHOLD: int | None = 5
+
+    # Optional read replicas, same driver URL format as POSTGRES_URL. Read
+    # endpoints round-robin over the healthy ones, clients stay on the
+    # primary for POSTGRES_PRIMARY_STICKINESS seconds after a write.
+    POSTGRES_REPLICA_URLS: list[str] = []
+    POSTGRES_REPLICA_CHECK_INTERVAL: float = 5
+    POSTGRES_PRIMARY_STICKINESS: int = 10
+
     REDIS_HOST: str
     REDIS_PORT: int
+
+    # Per-worker zip code -> partner cache, invalidated over Redis pub/sub
+    ZIPCODE_ROUTES_TTL: int = 300
+
+    # Monthly shipment_event partitions, see app.database.partitions
+    SHIPMENT_EVENT_PARTITIONS_AHEAD: int = 3
+    SHIPMENT_EVENT_RETENTION_MONTHS: int = 24
+
+    # Development and tests: X-Query-Count/X-Query-Rows headers and a log
+    # line per request, and failing requests that run more statements than
+    # their route's query_budget
+    QUERY_STATS: bool = False
+    QUERY_BUDGETS_ENFORCED: bool = False
+    # Statements slower than this are logged, with their plan if
+    # SLOW_QUERY_EXPLAIN is set. Unset to disable.
+    SLOW_QUERY_SECONDS: float | None = 0.5
+    SLOW_QUERY_EXPLAIN: bool = False
     
     model_config = _base_config
     
@@ -31,6 +81,25 @@ class SecuritySettings(BaseSettings):
     JWT_SECRET: str
     JWT_ALGORITHM: str
 
+    # Full resync of the per-worker revoked token filter, pub/sub keeps it
+    # current in between
+    TOKEN_BLACKLIST_SYNC_INTERVAL: int = 60
+
+    # bcrypt cost and the size of the thread pool hashing runs on
+    PASSWORD_HASH_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+
+    # Delivery codes expire with the out for delivery window, and a
+    # shipment is locked out of further checks for
+    # VERIFICATION_CODE_LOCKOUT seconds after too many wrong ones
+    VERIFICATION_CODE_TTL: int = 2 * 24 * 3600
+    VERIFICATION_CODE_MAX_ATTEMPTS: int = 5
+    VERIFICATION_CODE_LOCKOUT: int = 15 * 60
+
+    # Verified token claims and principal snapshots, per worker
+    PRINCIPAL_CACHE_SIZE: int = 10_000
+    PRINCIPAL_CACHE_TTL: int = 60
+
     model_config = _base_config
 
 class NotificationSettings(BaseSettings):
@@ -45,10 +114,82 @@ class NotificationSettings(BaseSettings):
     MAIL_SSL_TLS: bool = False
     USE_CREDENTIALS: bool = True
     VALIDATE_CERTS: bool = True
+    # Persistent SMTP connections held by each outbox worker
+    MAIL_POOL_SIZE: int = 4
+    MAIL_TIMEOUT: float = 60
 
     TWILIO_SID: str
     TWILIO_AUTH_TOKEN: str
     TWILIO_NUMBER: str
+    # Twilio compatible Messages endpoint, e.g. the local stub in app.stubs.sms
+    SMS_API_URL: str | None = None
+    SMS_POOL_SIZE: int = 10
+    SMS_TIMEOUT: float = 10
+
+    model_config = _base_config
+
+class OutboxSettings(BaseSettings):
+    # Rows claimed per poll and sends in flight per worker process
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_CONCURRENCY: int = 10
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    # A claimed row is retried by any worker once its lease runs out
+    OUTBOX_LEASE: int = 60
+    # Exponential backoff between attempts, dead-lettered after the last one
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_BACKOFF_BASE: float = 5.0
+    OUTBOX_BACKOFF_MAX: float = 3600.0
+    # Sent and dead rows are kept this long for inspection, with their
+    # payload reduced to its addressing fields, then purged
+    OUTBOX_RETENTION_DAYS: int = 7
+    OUTBOX_PURGE_INTERVAL: float = 3600.0
+    OUTBOX_PURGE_BATCH: int = 5000
+    # Port of each worker's Prometheus endpoint, unset to disable it
+    OUTBOX_METRICS_PORT: int | None = 9100
+
+    model_config = _base_config
+
+class RateLimit(BaseModel):
+    # Requests let through at once, refilled at per_minute
+    burst: int
+    per_minute: float
+
+class RouteRateLimits(BaseModel):
+    # Buckets per client IP, per account acted on and for the whole route
+    ip: RateLimit | None = None
+    account: RateLimit | None = None
+    route: RateLimit | None = None
+
+class RateLimitSettings(BaseSettings):
+    RATE_LIMIT_ENABLED: bool = True
+    # By route name, set as JSON to override, e.g.
+    # RATE_LIMITS='{"seller-token": {"ip": {"burst": 20, "per_minute": 20}}}'
+    # Logins are also capped per route at what the password hasher takes.
+    RATE_LIMITS: dict[str, RouteRateLimits] = {
+        "seller-token": RouteRateLimits(
+            ip=RateLimit(burst=20, per_minute=20),
+            account=RateLimit(burst=5, per_minute=5),
+            route=RateLimit(burst=100, per_minute=1200),
+        ),
+        "partner-token": RouteRateLimits(
+            ip=RateLimit(burst=20, per_minute=20),
+            account=RateLimit(burst=5, per_minute=5),
+            route=RateLimit(burst=100, per_minute=1200),
+        ),
+        "seller-signup": RouteRateLimits(ip=RateLimit(burst=5, per_minute=0.2)),
+        "partner-signup": RouteRateLimits(ip=RateLimit(burst=5, per_minute=0.2)),
+        "seller-forgot-password": RouteRateLimits(
+            ip=RateLimit(burst=5, per_minute=1),
+            account=RateLimit(burst=2, per_minute=0.2),
+        ),
+        "submit-shipment": RouteRateLimits(
+            account=RateLimit(burst=50, per_minute=600),
+        ),
+        # Up to 1000 shipments each
+        "submit-shipment-batch": RouteRateLimits(
+            account=RateLimit(burst=2, per_minute=1),
+        ),
+    }
 
     model_config = _base_config
 
@@ -58,4 +199,8 @@ db_settings = DatabaseSettings()
 
 security_settings = SecuritySettings()
 
-notification_settings = NotificationSettings()
\ No newline at end of file
+notification_settings = NotificationSettings()
+
+outbox_settings = OutboxSettings()
+
+rate_limit_settings = RateLimitSettings()
@@ -0,0 +1,141 @@
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import (
+    CounterMetricFamily,
+    GaugeMetricFamily,
+    HistogramMetricFamily,
+)
+from prometheus_client.registry import REGISTRY, Collector
+
+# Where a request spends its time, besides in our own code
+COMPONENTS = ("db", "redis", "template", "password_hash")
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, by route",
+    ["method", "route", "status"],
+)
+
+REQUEST_COMPONENT_DURATION = Histogram(
+    "http_request_component_duration_seconds",
+    "Time a request spent in the database, Redis, templates and password hashing",
+    ["method", "route", "component"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+NOTIFICATIONS_QUEUED = Counter(
+    "notifications_queued_total", "Notifications committed to the outbox", ["channel"]
+)
+
+NOTIFICATIONS_SENT = Counter(
+    "notifications_sent_total", "Notifications handed to their provider", ["channel"]
+)
+
+NOTIFICATIONS_FAILED = Counter(
+    "notifications_failed_total",
+    "Failed notification attempts, `dead` once no retry is left",
+    ["channel", "outcome"],
+)
+
+PARTNER_ASSIGNMENT_FAILURES = Counter(
+    "partner_assignment_failures_total",
+    "Shipments rejected because no delivery partner had capacity left",
+)
+
+RATE_LIMITED = Counter(
+    "rate_limited_requests_total", "Requests turned away with a 429", ["route"]
+)
+
+# Seconds per component of the request being served, None outside requests
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def track_request() -> dict[str, float]:
+    timings = dict.fromkeys(COMPONENTS, 0.0)
+    _request_timings.set(timings)
+    return timings
+
+
+def add_time(component: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[component] += seconds
+
+
+def timed(component: str):
+    """Adds the time spent in the decorated coroutine to the request's
+    `component` total."""
+
+    def decorator(fn: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                add_time(component, perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class StatsCollector(Collector):
+    """Exposes the connection pool and password hasher counters, read on
+    scrape rather than kept in sync on every checkout."""
+
+    def describe(self):
+        # Keeps registration from calling collect() while the modules it
+        # reads are still importing
+        return []
+
+    def collect(self):
+        # These modules report their own timings through this one
+        from app.core.passwords import password_hasher
+        from app.database.replicas import replicas
+        from app.database.session import get_pool_stats
+
+        pools = {"primary": get_pool_stats()}
+        pools.update(
+            (f"replica {name}", stats) for name, stats in replicas.pool_stats().items()
+        )
+
+        for name in ("size", "checked_out", "checked_in", "overflow"):
+            gauge = GaugeMetricFamily(
+                f"db_pool_{name}", f"Connection pool {name}", labels=["pool"]
+            )
+            for pool, stats in pools.items():
+                gauge.add_metric([pool], stats[name])
+            yield gauge
+
+        timeouts = CounterMetricFamily(
+            "db_pool_timeouts",
+            "Checkouts that gave up waiting for a connection",
+            labels=["pool"],
+        )
+        wait = HistogramMetricFamily(
+            "db_pool_wait_seconds", "Time spent checking out a connection", labels=["pool"]
+        )
+        for pool, stats in pools.items():
+            timeouts.add_metric([pool], stats["timeouts"])
+            wait.add_metric(
+                [pool],
+                buckets=list(stats["wait_seconds"]["buckets"].items()),
+                sum_value=stats["wait_seconds"]["sum"],
+            )
+        yield timeouts
+        yield wait
+
+        for name, value in password_hasher.stats().items():
+            yield GaugeMetricFamily(
+                f"password_hasher_{name}", f"Password hasher {name}", value=value
+            )
+
+
+REGISTRY.register(StatsCollector())
@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from passlib.context import CryptContext
+
+from app.config.config import security_settings
+from app.core.metrics import add_time
+
+# Hashes made with a different cost are flagged by verify_and_update
+password_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=security_settings.PASSWORD_HASH_ROUNDS,
+)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool instead of the event loop.
+
+    bcrypt releases the GIL, so threads give real parallelism here. Requests
+    beyond `max_workers` wait their turn, `queued` and `running` report how
+    deep that wait is.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.queued = 0
+        self.running = 0
+        self._slots = asyncio.Semaphore(max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+
+    async def _run(self, fn, *args):
+        # Waiting for a slot counts too, it is time the request spends on hashing
+        start = perf_counter()
+        try:
+            return await self._run_in_slot(fn, *args)
+        finally:
+            add_time("password_hash", perf_counter() - start)
+
+    async def _run_in_slot(self, fn, *args):
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, fn, *args
+            )
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(password_context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, password_hash: str
+    ) -> tuple[bool, str | None]:
+        """Returns whether the password matches and, if the stored hash used
+        outdated settings, a new hash to store in its place."""
+        return await self._run(password_context.verify_and_update, password, password_hash)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "queued": self.queued,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(max_workers=security_settings.PASSWORD_HASH_WORKERS)
@@ -0,0 +1,124 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import time
+from uuid import UUID
+from redis.exceptions import RedisError
+
+from app.config.config import security_settings
+from app.database.models import User
+from app.database.pubsub import subscriber
+from app.database.redis import publish
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "principals:invalidate"
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """What authenticated routes need to know about the caller, detached
+    from any session."""
+
+    kind: str
+    id: UUID
+    name: str
+    email: str
+    email_verified: bool
+    zip_code: int | None = None
+    max_handling_capacity: int | None = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            kind=user.__tablename__,
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            email_verified=user.email_verified,
+            zip_code=getattr(user, "zip_code", None),
+            max_handling_capacity=getattr(user, "max_handling_capacity", None),
+        )
+
+
+@dataclass(slots=True)
+class _Entry:
+    expires_at: float
+    claims: dict
+    principal: Principal | None = None
+
+
+class PrincipalCache:
+    """Bounded LRU of verified token claims and principal snapshots.
+
+    Entries live for at most `ttl` seconds and never past the token's own
+    exp. Revocation is still checked on every request, the cache only saves
+    the signature check and the principal lookup.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._tokens_by_user: dict[str, set[str]] = {}
+
+    def get(self, token: str) -> _Entry | None:
+        entry = self._entries.get(token)
+
+        if entry is None:
+            return None
+
+        if entry.expires_at < time():
+            self.discard(token)
+            return None
+
+        self._entries.move_to_end(token)
+        return entry
+
+    def add(self, token: str, claims: dict):
+        self._entries[token] = _Entry(
+            expires_at=min(time() + self.ttl, claims["exp"]), claims=claims
+        )
+        self._tokens_by_user.setdefault(claims["user"]["id"], set()).add(token)
+
+        while len(self._entries) > self.max_size:
+            self.discard(next(iter(self._entries)))
+
+    def discard(self, token: str):
+        entry = self._entries.pop(token, None)
+
+        if entry is not None:
+            user_id = entry.claims["user"]["id"]
+            tokens = self._tokens_by_user.get(user_id, set())
+            tokens.discard(token)
+            if not tokens:
+                self._tokens_by_user.pop(user_id, None)
+
+    def discard_user(self, user_id: str):
+        for token in self._tokens_by_user.pop(user_id, set()):
+            self._entries.pop(token, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_user.clear()
+
+    async def invalidate_user(self, user_id: UUID):
+        self.discard_user(str(user_id))
+
+        try:
+            await publish(INVALIDATION_CHANNEL, str(user_id))
+        except RedisError:
+            # Other workers catch up when their entries expire
+            logger.warning("Could not publish principal invalidation", exc_info=True)
+
+
+principal_cache = PrincipalCache(
+    max_size=security_settings.PRINCIPAL_CACHE_SIZE,
+    ttl=security_settings.PRINCIPAL_CACHE_TTL,
+)
+
+subscriber.subscribe(
+    INVALIDATION_CHANNEL,
+    principal_cache.discard_user,
+    on_reset=principal_cache.clear,
+)
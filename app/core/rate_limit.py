@@ -0,0 +1,83 @@
+import logging
+from math import ceil
+from time import monotonic
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from app.config.config import RouteRateLimits, rate_limit_settings
+from app.core.metrics import RATE_LIMITED
+from app.database.redis import take_rate_limit_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token buckets in Redis per client IP, per account and per route.
+
+    Each worker remembers which buckets Redis found empty and until when,
+    so a client that is already limited is turned away without a Redis
+    round trip. Requests are let through while Redis is unavailable.
+    """
+
+    def __init__(self, limits: dict[str, RouteRateLimits], max_blocked: int = 10_000):
+        self.limits = limits
+        self.max_blocked = max_blocked
+        # bucket key -> monotonic time it has a token again
+        self._blocked: dict[str, float] = {}
+
+    async def check(self, route: str, ip: str | None, account: str | None):
+        limits = self.limits.get(route)
+        if limits is None:
+            return
+
+        buckets = {}
+        for scope, limit, subject in (
+            ("ip", limits.ip, ip),
+            ("account", limits.account, account),
+            ("route", limits.route, "*"),
+        ):
+            if limit is not None and subject is not None:
+                buckets[f"ratelimit:{route}:{scope}:{subject}"] = (
+                    limit.burst, limit.per_minute / 60
+                )
+
+        if not buckets:
+            return
+
+        now = monotonic()
+        wait = max(self._blocked.get(key, 0) - now for key in buckets)
+
+        if wait <= 0:
+            try:
+                empty = await take_rate_limit_tokens(buckets)
+            except RedisError:
+                logger.warning("Rate limits unavailable, admitting request", exc_info=True)
+                return
+
+            if not empty:
+                return
+
+            self._block(empty, now)
+            wait = max(empty.values())
+
+        RATE_LIMITED.labels(route).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, try again later.",
+            headers={"Retry-After": str(max(1, ceil(wait)))},
+        )
+
+    def _block(self, empty: dict[str, float], now: float):
+        if len(self._blocked) >= self.max_blocked:
+            self._blocked = {
+                key: until for key, until in self._blocked.items() if until > now
+            }
+
+        for key, wait in empty.items():
+            self._blocked[key] = now + wait
+
+
+rate_limiter = RateLimiter(
+    rate_limit_settings.RATE_LIMITS if rate_limit_settings.RATE_LIMIT_ENABLED else {}
+)
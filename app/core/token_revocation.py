@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from redis.exceptions import RedisError
+
+from app.config.config import security_settings
+from app.database.pubsub import subscriber
+from app.database.redis import (
+    add_jti_to_blacklist,
+    get_blacklisted_jtis,
+    is_jti_blacklisted,
+    publish,
+)
+from app.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+REVOKED_CHANNEL = "blacklist:revoked"
+
+
+class RevokedTokens:
+    """Per-worker filter over the Redis token blacklist.
+
+    A jti that is not in the filter was not revoked, which answers the common
+    case without a Redis round trip. Possible hits are confirmed in Redis.
+    Revocations reach every worker over pub/sub; while the subscription is
+    down the filter is dropped and every check goes to Redis until it is
+    back and a full sync has run, so a revocation is never missed for longer
+    than pub/sub delivery takes.
+    """
+
+    def __init__(self, sync_interval: float, min_capacity: int = 10_000):
+        self.sync_interval = sync_interval
+        self.min_capacity = min_capacity
+        self._filter: BloomFilter | None = None
+        # Revocations received while a sync is reading the snapshot
+        self._pending: set[str] | None = None
+        self._resync = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def is_revoked(self, jti: str) -> bool:
+        if self._filter is not None and jti not in self._filter:
+            return False
+
+        return bool(await is_jti_blacklisted(jti))
+
+    async def revoke(self, jti: str, exp: int):
+        await add_jti_to_blacklist(jti, exp)
+        self.on_revoked(jti)
+
+        try:
+            await publish(REVOKED_CHANNEL, jti)
+        except RedisError:
+            # Other workers pick it up on their next full sync
+            logger.warning("Could not publish token revocation", exc_info=True)
+
+    def on_revoked(self, jti: str):
+        if self._filter is not None:
+            self._filter.add(jti)
+        if self._pending is not None:
+            self._pending.add(jti)
+
+    def on_reset(self):
+        # Revocations may have been missed, fall back to Redis until resynced
+        self._filter = None
+        self._resync.set()
+
+    async def sync(self):
+        self._pending = set()
+
+        try:
+            jtis = await get_blacklisted_jtis()
+
+            # Rebuilding also drops tokens that have expired since the last sync
+            new_filter = BloomFilter(capacity=max(self.min_capacity, 2 * len(jtis)))
+            for jti in (*jtis, *self._pending):
+                new_filter.add(jti)
+
+            # Revocations published while pub/sub is down would never reach
+            # it, Redis answers until the subscription is back and resyncs
+            if subscriber.connected:
+                self._filter = new_filter
+        finally:
+            self._pending = None
+
+    def start(self):
+        if self._task is None:
+            self._resync.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._resync.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._resync.clear()
+
+            try:
+                await self.sync()
+            except RedisError:
+                logger.warning("Could not sync revoked tokens", exc_info=True)
+
+
+revoked_tokens = RevokedTokens(
+    sync_interval=security_settings.TOKEN_BLACKLIST_SYNC_INTERVAL
+)
+
+subscriber.subscribe(
+    REVOKED_CHANNEL,
+    revoked_tokens.on_revoked,
+    on_reset=revoked_tokens.on_reset,
+)
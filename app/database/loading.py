@@ -0,0 +1,70 @@
+from datetime import datetime
+from enum import Enum
+from uuid import UUID
+from sqlalchemy import ColumnElement, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import SQLModel
+from app.database.models import Shipment, ShipmentEvent
+
+# Relationships are not loaded by default (lazy="raise_on_sql"), every
+# query picks one of these profiles to say what it actually needs.
+class LoadProfile(str, Enum):
+    principal_only = "principal-only"
+    shipment_summary = "shipment-summary"
+    shipment_with_timeline = "shipment-with-timeline"
+
+
+_shipment_parties = (
+    joinedload(Shipment.seller),
+    joinedload(Shipment.delivery_partner),
+)
+
+_load_options = {
+    LoadProfile.principal_only: (),
+    LoadProfile.shipment_summary: _shipment_parties,
+    # Plus the timeline, by a query of its own (see _after_get)
+    LoadProfile.shipment_with_timeline: _shipment_parties,
+}
+
+
+def load_options(profile: LoadProfile | None) -> tuple:
+    return _load_options[profile] if profile else ()
+
+
+def timeline_criteria(shipment_id: UUID, shipment_created_at: datetime | ColumnElement) -> tuple:
+    # Events never predate their shipment, the lower bound lets Postgres
+    # skip every shipment_event partition older than the shipment
+    return (
+        ShipmentEvent.shipment_id == shipment_id,
+        ShipmentEvent.created_at >= shipment_created_at,
+    )
+
+
+async def load_timeline(session: AsyncSession, shipment: Shipment):
+    events = await session.scalars(
+        select(ShipmentEvent)
+        .where(*timeline_criteria(shipment.id, shipment.created_at))
+        .order_by(ShipmentEvent.created_at)
+    )
+    set_committed_value(shipment, "timeline", list(events))
+
+
+# Collections loaded after the row by a query of their own, a joined load
+# would repeat the row once per item
+_after_get = {
+    LoadProfile.shipment_with_timeline: load_timeline,
+}
+
+
+async def get_with_profile(
+    session: AsyncSession, model: type[SQLModel], id: UUID, profile: LoadProfile | None, **kwargs
+):
+    """session.get() with everything `profile` asks for, None if there is no such row."""
+    instance = await session.get(model, id, options=load_options(profile), **kwargs)
+
+    if instance is not None and profile in _after_get:
+        await _after_get[profile](session, instance)
+
+    return instance
@@ -4,7 +4,7 @@ from pydantic import EmailStr
 from sqlmodel import Column, Field, Relationship, SQLModel
 from uuid import uuid4, UUID
 from sqlalchemy.dialects import postgresql
-from sqlalchemy import ARRAY, INTEGER
+from sqlalchemy import DDL, INTEGER, Index, event, text
 
 class ShipmentStatus(str, Enum):
     placed = "placed"
@@ -13,8 +13,17 @@ class ShipmentStatus(str, Enum):
     delivered = "delivered"
     cancelled = "cancelled"
 
+TERMINAL_STATUSES = (ShipmentStatus.delivered, ShipmentStatus.cancelled)
+
 class Shipment(SQLModel, table=True):
     __tablename__ = "shipment"
+    __table_args__ = (
+        Index("ix_shipment_delivery_partner_id_current_status", "delivery_partner_id", "current_status"),
+        Index("ix_shipment_seller_id_current_status", "seller_id", "current_status"),
+        # Keyset pagination of listings on (created_at, id)
+        Index("ix_shipment_seller_id_created_at_id", "seller_id", "created_at", "id"),
+        Index("ix_shipment_delivery_partner_id_created_at_id", "delivery_partner_id", "created_at", "id"),
+    )
 
     id: UUID = Field(
         sa_column=Column(
@@ -32,26 +41,48 @@ class Shipment(SQLModel, table=True):
     destination: int
     estimated_delivery: datetime
 
-    timeline: list["ShipmentEvent"] = Relationship(back_populates="shipment", sa_relationship_kwargs={"lazy": "selectin"})
+    timeline: list["ShipmentEvent"] = Relationship(back_populates="shipment", sa_relationship_kwargs={"lazy": "raise_on_sql", "order_by": "ShipmentEvent.created_at"})
 
     seller_id: UUID = Field(foreign_key="seller.id")
-    seller: "Seller" = Relationship(back_populates="shipments", sa_relationship_kwargs={"lazy": "selectin"})
+    seller: "Seller" = Relationship(back_populates="shipments", sa_relationship_kwargs={"lazy": "raise_on_sql"})
 
     delivery_partner_id : UUID = Field(foreign_key="delivery_partner.id")
 
-    delivery_partner : "DeliveryPartner" = Relationship(back_populates="shipments", sa_relationship_kwargs={"lazy": "selectin"})
+    delivery_partner : "DeliveryPartner" = Relationship(back_populates="shipments", sa_relationship_kwargs={"lazy": "raise_on_sql"})
 
     created_at : datetime = Field(sa_column=Column(
         postgresql.TIMESTAMP,
-        default=datetime.now
+        default=datetime.now,
+        nullable=False
+    ))
+
+    # Copy of the latest timeline event, kept in sync by ShipmentEventService
+    current_status: ShipmentStatus | None = Field(default=None)
+    current_location: int | None = Field(default=None)
+    last_event_at: datetime | None = Field(default=None, sa_column=Column(
+        postgresql.TIMESTAMP
+    ))
+
+    # Bumped on every change of the row, new events and estimate changes
+    # alike, it is the Last-Modified of the shipment
+    updated_at: datetime | None = Field(default=None, sa_column=Column(
+        postgresql.TIMESTAMP,
+        default=datetime.now,
+        onupdate=datetime.now,
     ))
 
     @property
     def status(self):
-        return self.timeline[-1].status if len(self.timeline) > 0 else None
+        return self.current_status
 
 class ShipmentEvent(SQLModel, table=True):
     __tablename__= "shipment_event"
+    # Monthly range partitions managed by app.database.partitions, the
+    # partition key has to be part of the primary key
+    __table_args__ = (
+        Index("ix_shipment_event_shipment_id_created_at", "shipment_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: UUID = Field(
         sa_column=Column(
@@ -63,7 +94,8 @@ class ShipmentEvent(SQLModel, table=True):
 
     created_at : datetime = Field(sa_column=Column(
         postgresql.TIMESTAMP,
-        default=datetime.now
+        default=datetime.now,
+        primary_key=True
     ))
 
     location: int
@@ -72,7 +104,14 @@ class ShipmentEvent(SQLModel, table=True):
 
     shipment_id: UUID = Field(foreign_key="shipment.id")
 
-    shipment: Shipment = Relationship(back_populates="timeline", sa_relationship_kwargs={"lazy": "selectin"})
+    shipment: Shipment = Relationship(back_populates="timeline", sa_relationship_kwargs={"lazy": "raise_on_sql"})
+
+# Catches rows outside the monthly partitions until they get their own
+event.listen(
+    ShipmentEvent.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS shipment_event_default PARTITION OF shipment_event DEFAULT"),
+)
 
 class User(SQLModel):
     name: str
@@ -91,7 +130,7 @@ class Seller(User, table=True):
         )
     )
 
-    shipments : list[Shipment] = Relationship(back_populates="seller", sa_relationship_kwargs={"lazy": "selectin"})
+    shipments : list[Shipment] = Relationship(back_populates="seller", sa_relationship_kwargs={"lazy": "raise_on_sql"})
 
     address: str | None = Field(default=None)
     zip_code: int | None = Field(default=None)
@@ -103,6 +142,15 @@ class Seller(User, table=True):
 
 class DeliveryPartner(User, table=True):
     __tablename__ = "delivery_partner"
+    # Server defaults come back through INSERT/UPDATE ... RETURNING
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        Index(
+            "ix_delivery_partner_serviceable_zip_codes",
+            "serviceable_zip_codes",
+            postgresql_using="gin",
+        ),
+    )
 
     id: UUID = Field(
         sa_column=Column(
@@ -113,27 +161,71 @@ class DeliveryPartner(User, table=True):
     )
 
     serviceable_zip_codes: list[int] = Field(
-        sa_column=Column(ARRAY(INTEGER))
+        sa_column=Column(postgresql.ARRAY(INTEGER))
     )
 
     max_handling_capacity: int
+    # Shipments assigned and not yet delivered or cancelled, maintained in SQL
+    # by DeliveryPartnerService so capacity checks never load shipments
+    active_shipment_count: int = Field(
+        default=0,
+        sa_column_kwargs={"server_default": "0"},
+    )
 
-    shipments : list["Shipment"] = Relationship(back_populates="delivery_partner", sa_relationship_kwargs={"lazy": "selectin"})
+    shipments : list["Shipment"] = Relationship(back_populates="delivery_partner", sa_relationship_kwargs={"lazy": "raise_on_sql"})
 
     created_at : datetime = Field(sa_column=Column(
         postgresql.TIMESTAMP,
         default=datetime.now
     ))
-    
-    @property
-    def active_shipments(self):
-        return [
-            shipment
-            for shipment in self.shipments
-            if shipment.status != ShipmentStatus.delivered
-            or shipment.status != ShipmentStatus.cancelled
-        ]
-        
+
     @property
     def current_handling_capacity(self):
-        return self.max_handling_capacity - len(self.active_shipments)
+        return self.max_handling_capacity - self.active_shipment_count
+
+
+class NotificationChannel(str, Enum):
+    email = "email"
+    sms = "sms"
+
+class NotificationStatus(str, Enum):
+    pending = "pending"
+    sent = "sent"
+    dead = "dead"
+
+class Notification(SQLModel, table=True):
+    # Written in the same transaction as the change it reports on and
+    # delivered by the outbox worker (python -m app.worker)
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index(
+            "ix_notification_outbox_pending",
+            "next_attempt_at",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
+    id: UUID = Field(
+        sa_column=Column(
+            postgresql.UUID,
+            default=uuid4,
+            primary_key=True
+        )
+    )
+
+    channel: NotificationChannel
+    payload: dict = Field(sa_column=Column(postgresql.JSONB, nullable=False))
+
+    status: NotificationStatus = Field(default=NotificationStatus.pending)
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(sa_column=Column(
+        postgresql.TIMESTAMP,
+        default=datetime.now,
+        nullable=False
+    ))
+    last_error: str | None = Field(default=None)
+
+    created_at : datetime = Field(sa_column=Column(
+        postgresql.TIMESTAMP,
+        default=datetime.now
+    ))
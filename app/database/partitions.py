@@ -0,0 +1,129 @@
+"""Monthly range partitions of shipment_event.
+
+    python -m app.database.partitions [--ahead N] [--retention-months N] [--drop]
+
+Creates the partitions for the current month and the next `--ahead` months,
+then detaches the partitions that ended more than `--retention-months` ago,
+dropping them with `--drop`. Meant to run daily from cron or a scheduler.
+Rows that landed in the default partition are moved into the new partition
+when it is created.
+"""
+import argparse
+import asyncio
+import logging
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config.config import db_settings
+from app.database.session import engine
+
+logger = logging.getLogger(__name__)
+
+PARENT = "shipment_event"
+DEFAULT_PARTITION = f"{PARENT}_default"
+
+_PARTITION_NAME = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+async def list_partitions(connection: AsyncConnection) -> dict[str, date]:
+    names = await connection.scalars(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :parent
+    """), {"parent": PARENT})
+
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[name] = date(int(match[1]), int(match[2]), 1)
+
+    return partitions
+
+
+async def create_partition(connection: AsyncConnection, month: date):
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    bounds = {"start": datetime.combine(start, datetime.min.time()),
+              "end": datetime.combine(end, datetime.min.time())}
+
+    # Built detached so rows already sitting in the default partition for
+    # this range can be moved over before attaching
+    await connection.execute(text(
+        f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    moved = await connection.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE created_at >= :start AND created_at < :end
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), bounds)
+    await connection.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+    logger.info("Created partition %s (%d rows moved from default)", name, moved.rowcount)
+
+
+async def expire_partition(connection: AsyncConnection, name: str, drop: bool):
+    await connection.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+
+    if drop:
+        await connection.execute(text(f"DROP TABLE {name}"))
+
+    logger.info("%s partition %s", "Dropped" if drop else "Detached", name)
+
+
+async def maintain(ahead: int, retention_months: int, drop: bool):
+    this_month = date.today().replace(day=1)
+
+    async with engine.connect() as connection:
+        existing = await list_partitions(connection)
+        await connection.rollback()
+
+    # One transaction per partition, a failure leaves the others in place
+    for offset in range(ahead + 1):
+        month = add_months(this_month, offset)
+        if partition_name(month) not in existing:
+            async with engine.begin() as connection:
+                await create_partition(connection, month)
+
+    cutoff = add_months(this_month, -retention_months)
+    for name, month in sorted(existing.items(), key=lambda item: item[1]):
+        if add_months(month, 1) <= cutoff:
+            async with engine.begin() as connection:
+                await expire_partition(connection, name, drop)
+
+
+async def main(ahead: int, retention_months: int, drop: bool):
+    try:
+        await maintain(ahead, retention_months, drop)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ahead", type=int, default=db_settings.SHIPMENT_EVENT_PARTITIONS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=db_settings.SHIPMENT_EVENT_RETENTION_MONTHS)
+    parser.add_argument("--drop", action="store_true", help="drop expired partitions instead of only detaching them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.ahead, args.retention_months, args.drop))
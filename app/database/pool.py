@@ -0,0 +1,60 @@
+from bisect import bisect_left
+from time import perf_counter
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+
+class PoolStats:
+    """Checkout wait time histogram, cumulative like Prometheus buckets."""
+
+    buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.wait_counts = [0] * (len(self.buckets) + 1)
+        self.wait_sum = 0.0
+        self.timeouts = 0
+
+    def observe_wait(self, seconds: float):
+        self.wait_counts[bisect_left(self.buckets, seconds)] += 1
+        self.wait_sum += seconds
+
+    def snapshot(self, pool: Pool) -> dict:
+        cumulative, histogram = 0, {}
+        for bound, count in zip((*self.buckets, "+Inf"), self.wait_counts):
+            cumulative += count
+            histogram[str(bound)] = cumulative
+
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "timeouts": self.timeouts,
+            "wait_seconds": {
+                "count": cumulative,
+                "sum": self.wait_sum,
+                "buckets": histogram,
+            },
+        }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    # Times every checkout, including waiting for a connection to be returned
+    # when the pool and its overflow are exhausted. Every engine has its own
+    # pool and so its own stats.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def snapshot(self) -> dict:
+        return self.stats.snapshot(self)
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.observe_wait(perf_counter() - start)
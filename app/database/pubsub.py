@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections.abc import Callable
+from redis.exceptions import RedisError
+
+from app.database.redis import get_pubsub
+
+logger = logging.getLogger(__name__)
+
+
+class RedisSubscriber:
+    """One pub/sub connection per worker, dispatching to in-process handlers.
+
+    Handlers run on the event loop and must not block. `on_reset` is called
+    as soon as the connection is lost and again once it is re-established,
+    since messages published while disconnected are lost and local state may
+    be stale. `connected` tells whether messages are being received.
+    """
+
+    def __init__(self, reconnect_delay: float = 1.0):
+        self.reconnect_delay = reconnect_delay
+        self._handlers: dict[str, list[Callable[[str], None]]] = {}
+        self._resets: list[Callable[[], None]] = []
+        self._task: asyncio.Task | None = None
+        self.connected = False
+
+    def subscribe(
+        self,
+        channel: str,
+        handler: Callable[[str], None],
+        on_reset: Callable[[], None] | None = None,
+    ):
+        self._handlers.setdefault(channel, []).append(handler)
+        if on_reset:
+            self._resets.append(on_reset)
+
+    def start(self):
+        if self._task is None and self._handlers:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            pubsub = get_pubsub()
+            try:
+                await pubsub.subscribe(*self._handlers)
+                self.connected = True
+                self._reset()
+
+                async for message in pubsub.listen():
+                    for handler in self._handlers.get(message["channel"], ()):
+                        try:
+                            handler(message["data"])
+                        except Exception:
+                            logger.exception("Pub/sub handler failed on %s", message["channel"])
+            except (RedisError, OSError):
+                logger.warning("Pub/sub connection lost, reconnecting", exc_info=True)
+                self.connected = False
+                self._reset()
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                self.connected = False
+                await pubsub.aclose()
+
+    def _reset(self):
+        for reset in self._resets:
+            reset()
+
+
+subscriber = RedisSubscriber()
@@ -0,0 +1,108 @@
+import logging
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config.config import db_settings
+from app.core.metrics import add_time
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass(slots=True)
+class QueryStats:
+    statements: int = 0
+    rows: int = 0
+
+
+# Set by QueryStatsMiddleware, None when the stats are not collected
+_request_queries: ContextVar[QueryStats | None] = ContextVar("request_queries", default=None)
+
+
+def track_queries() -> QueryStats:
+    stats = QueryStats()
+    _request_queries.set(stats)
+    return stats
+
+
+def query_budget(statements: int):
+    """Most statements a route may run, checked by QueryStatsMiddleware
+    when budgets are enforced. Goes below the route decorator."""
+
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.query_budget = statements
+        return endpoint
+
+    return decorator
+
+
+def _parameters_shape(parameters) -> str:
+    # Names and types only, values may be personal data
+    if isinstance(parameters, dict):
+        return repr({name: type(value).__name__ for name, value in parameters.items()})
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        return f"{len(parameters)} x {_parameters_shape(parameters[0])}"
+    return repr([type(value).__name__ for value in parameters or ()])
+
+
+def _explain(connection: Connection, statement: str, parameters) -> str:
+    # Own cursor on the same connection, the original one already holds its
+    # rows. Bypasses the engine events, so it is neither counted nor timed.
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _start_query(connection, cursor, statement, parameters, context, executemany):
+    connection.info["query_start"] = perf_counter()
+
+
+def _end_query(connection, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - connection.info.pop("query_start")
+    add_time("db", elapsed)
+
+    stats = _request_queries.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.rows += max(cursor.rowcount, 0)
+
+    threshold = db_settings.SLOW_QUERY_SECONDS
+    if threshold is None or elapsed < threshold:
+        return
+
+    plan = None
+    # Only plain SELECTs, EXPLAIN of anything else is not worth the risk of
+    # failing the transaction it runs in
+    if db_settings.SLOW_QUERY_EXPLAIN and not executemany and statement.lstrip()[:6].upper() == "SELECT":
+        try:
+            plan = _explain(connection, statement, parameters)
+        except Exception as error:
+            plan = f"EXPLAIN failed: {error!r}"
+
+    logger.warning(
+        "Slow query (%.0f ms, %d rows): %s\nparameters: %s%s",
+        elapsed * 1000,
+        cursor.rowcount,
+        statement,
+        _parameters_shape(parameters),
+        f"\n{plan}" if plan else "",
+    )
+
+
+def instrument(engine: AsyncEngine):
+    """Times every statement for the request metrics, counts statements and
+    rows per request and logs the slow ones."""
+    event.listen(engine.sync_engine, "before_cursor_execute", _start_query)
+    event.listen(engine.sync_engine, "after_cursor_execute", _end_query)
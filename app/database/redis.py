@@ -1,7 +1,10 @@
+from enum import Enum
+from time import time
 from uuid import UUID
 from redis.asyncio import Redis
 
 from app.config.config import db_settings
+from app.core.metrics import timed
 
 _token_blacklist = Redis(
     host=db_settings.REDIS_HOST,
@@ -16,14 +19,179 @@ _shipment_verification_codes = Redis(
     decode_responses=True,
 )
 
-async def add_jti_to_blacklist(jti: str):
-    await _token_blacklist.set(jti, "blacklisted")
+_idempotency_keys = Redis(
+    host=db_settings.REDIS_HOST,
+    port=db_settings.REDIS_PORT,
+    db = 2,
+)
+
+_rate_limits = Redis(
+    host=db_settings.REDIS_HOST,
+    port=db_settings.REDIS_PORT,
+    db = 3,
+    decode_responses=True,
+)
+
+_pubsub = Redis(
+    host=db_settings.REDIS_HOST,
+    port=db_settings.REDIS_PORT,
+    decode_responses=True,
+)
+
+# Checks a delivery code against the one issued, counting mismatches per
+# shipment in the same step. Once `max_attempts` are reached within
+# `lockout` seconds every check fails until the window runs out. A matching
+# code is left in place, it is deleted once the delivery commits.
+#   KEYS: code, attempts   ARGV: code, max_attempts, lockout
+_check_verification_code = _shipment_verification_codes.register_script("""
+local attempts = tonumber(redis.call("GET", KEYS[2]) or "0")
+if attempts >= tonumber(ARGV[2]) then
+    return {"locked", redis.call("TTL", KEYS[2])}
+end
+
+local code = redis.call("GET", KEYS[1])
+if not code then
+    return {"missing", 0}
+end
+
+if code == ARGV[1] then
+    redis.call("DEL", KEYS[2])
+    return {"valid", 0}
+end
+
+if redis.call("INCR", KEYS[2]) == 1 then
+    redis.call("EXPIRE", KEYS[2], ARGV[3])
+end
+return {"invalid", 0}
+""")
+
+
+# Token buckets, refilled at `rate` per second up to `burst`. A token is
+# taken from every bucket or, if any of them is empty, from none. Returns
+# the empty buckets, each followed by the seconds until it has a token.
+#   KEYS: buckets   ARGV: burst, rate for each bucket
+_take_rate_limit_tokens = _rate_limits.register_script("""
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+local empty = {}
 
+for i, key in ipairs(KEYS) do
+    local burst, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local bucket = redis.call("HMGET", key, "tokens", "at")
+    local available = tonumber(bucket[1]) or burst
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+
+    tokens[i] = math.min(burst, available + elapsed * rate)
+    if tokens[i] < 1 then
+        table.insert(empty, key)
+        table.insert(empty, tostring((1 - tokens[i]) / rate))
+    end
+end
+
+if #empty > 0 then
+    return empty
+end
+
+for i, key in ipairs(KEYS) do
+    local burst, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call("HSET", key, "tokens", tostring(tokens[i] - 1), "at", tostring(now))
+    redis.call("EXPIRE", key, math.ceil(burst / rate) + 1)
+end
+return empty
+""")
+
+
+class CodeCheck(str, Enum):
+    valid = "valid"
+    invalid = "invalid"
+    missing = "missing"
+    locked = "locked"
+
+# jti -> exp of every revoked token, lets workers rebuild their local filter
+_BLACKLIST_INDEX = "blacklist:index"
+
+@timed("redis")
+async def add_jti_to_blacklist(jti: str, exp: int):
+    async with _token_blacklist.pipeline(transaction=True) as pipe:
+        # Entries expire together with the token they revoke
+        pipe.set(jti, "blacklisted", exat=exp)
+        pipe.zadd(_BLACKLIST_INDEX, {jti: exp})
+        pipe.zremrangebyscore(_BLACKLIST_INDEX, "-inf", time())
+        await pipe.execute()
+
+@timed("redis")
+async def get_blacklisted_jtis() -> list[str]:
+    jtis = await _token_blacklist.zrangebyscore(_BLACKLIST_INDEX, time(), "+inf")
+    return [jti.decode() for jti in jtis]
+
+@timed("redis")
 async def is_jti_blacklisted(jti: str):
     return await _token_blacklist.exists(jti)
 
-async def add_shipment_verification_code(id: UUID, code: int):
-    await _shipment_verification_codes.set(str(id), code)
+@timed("redis")
+async def add_shipment_verification_code(id: UUID, code: int, ttl: int):
+    await _shipment_verification_codes.set(str(id), code, ex=ttl)
+
+@timed("redis")
+async def check_shipment_verification_code(
+    id: UUID, code: str, max_attempts: int, lockout: int
+) -> tuple[CodeCheck, int]:
+    """The outcome and, when locked, the seconds until the next attempt"""
+    result, retry_after = await _check_verification_code(
+        keys=[str(id), f"{id}:attempts"],
+        args=[code, max_attempts, lockout],
+    )
+    return CodeCheck(result), retry_after
+
+@timed("redis")
+async def delete_shipment_verification_code(id: UUID):
+    await _shipment_verification_codes.delete(str(id))
+
+@timed("redis")
+async def claim_idempotency_key(key: str, record: bytes, ttl: int) -> bytes | None:
+    """Stores `record` unless the key is taken, None if it was stored and
+    the existing record otherwise"""
+    return await _idempotency_keys.set(key, record, ex=ttl, nx=True, get=True)
+
+@timed("redis")
+async def get_idempotency_record(key: str) -> bytes | None:
+    return await _idempotency_keys.get(key)
+
+@timed("redis")
+async def save_idempotency_record(key: str, record: bytes, ttl: int):
+    await _idempotency_keys.set(key, record, ex=ttl)
+
+@timed("redis")
+async def release_idempotency_key(key: str):
+    await _idempotency_keys.delete(key)
+
+@timed("redis")
+async def take_rate_limit_tokens(
+    buckets: dict[str, tuple[int, float]]
+) -> dict[str, float]:
+    """Takes a token from each bucket (key -> burst, rate per second). Empty
+    if they were taken, otherwise the seconds each empty bucket needs."""
+    empty = await _take_rate_limit_tokens(
+        keys=list(buckets),
+        args=[value for limit in buckets.values() for value in limit],
+    )
+    return {key: float(wait) for key, wait in zip(empty[::2], empty[1::2])}
+
+@timed("redis")
+async def publish(channel: str, message: str):
+    await _pubsub.publish(channel, message)
+
+def get_pubsub():
+    return _pubsub.pubsub(ignore_subscribe_messages=True)
 
-async def get_shipment_verification_codes(id: UUID) -> str:
-    return str(await _shipment_verification_codes.get(str(id)))
\ No newline at end of file
+async def disconnect():
+    # Pooled connections belong to the event loop that opened them
+    for client in (
+        _token_blacklist,
+        _shipment_verification_codes,
+        _idempotency_keys,
+        _rate_limits,
+        _pubsub,
+    ):
+        await client.connection_pool.disconnect()
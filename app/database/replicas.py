@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from itertools import count
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.config.config import db_settings
+from app.database.session import create_engine, create_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = "db_primary"
+
+# Per request flag set by UnitOfWork.commit, read by PrimaryStickinessMiddleware
+_request_writes: ContextVar[dict | None] = ContextVar("request_writes", default=None)
+
+
+def track_writes() -> dict:
+    state = {"written": False}
+    _request_writes.set(state)
+    return state
+
+
+def mark_written():
+    state = _request_writes.get()
+    if state is not None:
+        state["written"] = True
+
+
+class ReplicaSet:
+    """Round-robin over the replicas that passed their last health check.
+
+    Every replica gets its own engine and pool. A background task checks them
+    every `check_interval` seconds, a replica that fails is skipped until it
+    answers again.
+    """
+
+    def __init__(self, urls: list[str], check_interval: float):
+        self.check_interval = check_interval
+        self._sessions: dict[AsyncEngine, async_sessionmaker[AsyncSession]] = {}
+        for url in urls:
+            engine = create_engine(url)
+            self._sessions[engine] = create_sessionmaker(engine)
+
+        self._healthy: list[AsyncEngine] = list(self._sessions)
+        self._turn = count()
+        self._task: asyncio.Task | None = None
+
+    def __bool__(self) -> bool:
+        return bool(self._sessions)
+
+    def pool_stats(self) -> dict[str, dict]:
+        return {
+            f"{engine.url.host}:{engine.url.port}": engine.pool.snapshot()
+            for engine in self._sessions
+        }
+
+    def session_factory(self) -> async_sessionmaker[AsyncSession] | None:
+        healthy = self._healthy
+        if not healthy:
+            return None
+
+        return self._sessions[healthy[next(self._turn) % len(healthy)]]
+
+    async def check(self):
+        healthy = []
+
+        for engine in self._sessions:
+            try:
+                async with asyncio.timeout(self.check_interval):
+                    async with engine.connect() as connection:
+                        await connection.execute(text("SELECT 1"))
+            except Exception as error:
+                if engine in self._healthy:
+                    logger.warning("Replica %s failed its health check: %r", engine.url, error)
+                continue
+
+            if engine not in self._healthy:
+                logger.info("Replica %s is back", engine.url)
+            healthy.append(engine)
+
+        self._healthy = healthy
+
+    def start(self):
+        if self._task is None and self._sessions:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for engine in self._sessions:
+            await engine.dispose()
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+
+replicas = ReplicaSet(
+    db_settings.POSTGRES_REPLICA_URLS,
+    check_interval=db_settings.POSTGRES_REPLICA_CHECK_INTERVAL,
+)
@@ -1,15 +1,43 @@
 from typing import Annotated
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine, AsyncSession
 from sqlmodel import SQLModel
 from fastapi import Depends
-from sqlalchemy.orm import sessionmaker
 
 from app.config.config import db_settings
+from app.database.pool import InstrumentedQueuePool
+from app.database.query_stats import instrument
 
-engine = create_async_engine(
-    # database type/dialect and file name
-    url=db_settings.POSTGRES_URL,
-)
+def create_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(
+        # database type/dialect and file name
+        url=url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=db_settings.POSTGRES_POOL_SIZE,
+        max_overflow=db_settings.POSTGRES_MAX_OVERFLOW,
+        pool_timeout=db_settings.POSTGRES_POOL_TIMEOUT,
+        pool_recycle=db_settings.POSTGRES_POOL_RECYCLE,
+        pool_pre_ping=db_settings.POSTGRES_POOL_PRE_PING,
+        connect_args={"prepare_threshold": db_settings.POSTGRES_PREPARE_THRESHOLD},
+    )
+
+    instrument(engine)
+    return engine
+
+
+def create_sessionmaker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        # Changes are flushed once, by UnitOfWork.commit
+        autoflush=False,
+    )
+
+
+engine = create_engine(db_settings.POSTGRES_URL)
+
+# Built once per process, sessions themselves are per request
+async_session = create_sessionmaker(engine)
 
 async def create_database_tables():
     async with engine.begin() as connection:
@@ -17,12 +45,10 @@ async def create_database_tables():
         await connection.run_sync(SQLModel.metadata.create_all)
 
 async def get_session():
-    async_session = sessionmaker(
-        bind=engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
     async with async_session() as session:
         yield session
 
-SessionDep = Annotated[AsyncSession, Depends(get_session)]
\ No newline at end of file
+def get_pool_stats() -> dict:
+    return engine.pool.snapshot()
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
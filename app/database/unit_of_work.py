@@ -0,0 +1,55 @@
+from collections.abc import Awaitable, Callable
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import SQLModel
+from app.database.replicas import mark_written
+
+
+class UnitOfWork:
+    """Request-scoped transaction shared by every service of a request.
+
+    Services only stage changes, the public service method that finishes the
+    request calls `commit()` once, which flushes everything in a single pass.
+    Side effects that must only happen once the data is durable (cache
+    invalidation, pub/sub) are registered with `after_commit`.
+
+    Read-only units of work may start on a replica session, `primary` then
+    opens the session reads fall back to when the replica is behind.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        primary: async_sessionmaker[AsyncSession] | None = None,
+    ):
+        self.session = session
+        self._primary = primary
+        self._after_commit: list[Callable[[], Awaitable[None]]] = []
+
+    async def use_primary(self) -> bool:
+        """Moves to the primary, False if the session already is on it"""
+        if self._primary is None:
+            return False
+
+        await self.session.close()
+        self.session, self._primary = self._primary(), None
+        return True
+
+    async def close(self):
+        await self.session.close()
+
+    def add(self, entity: SQLModel):
+        self.session.add(entity)
+
+    def add_all(self, entities: list[SQLModel]):
+        self.session.add_all(entities)
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]):
+        self._after_commit.append(callback)
+
+    async def commit(self):
+        await self.session.commit()
+        mark_written()
+
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            await callback()
@@ -1,18 +1,57 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from scalar_fastapi import get_scalar_api_reference
-from app.database.session import create_database_tables
+from app.core.passwords import password_hasher
+from app.core.token_revocation import revoked_tokens
+from app.database.pubsub import subscriber
+from app.database.replicas import replicas
+from app.database.session import create_database_tables, get_pool_stats
+from app.utils.templates import precompile_templates
+from app.api.middleware import MetricsMiddleware, PrimaryStickinessMiddleware, QueryStatsMiddleware
 from app.api.router import master_router
+from app.config.config import db_settings
 
 @asynccontextmanager
 async def lifespan_handler(app: FastAPI):
     await create_database_tables()
+    precompile_templates()
+    subscriber.start()
+    revoked_tokens.start()
+    replicas.start()
     yield
+    await replicas.stop()
+    await revoked_tokens.stop()
+    await subscriber.stop()
+    password_hasher.shutdown()
 
 app = FastAPI(lifespan=lifespan_handler)
 
 app.include_router(master_router)
 
+if replicas:
+    app.add_middleware(
+        PrimaryStickinessMiddleware, seconds=db_settings.POSTGRES_PRIMARY_STICKINESS
+    )
+
+if db_settings.QUERY_STATS or db_settings.QUERY_BUDGETS_ENFORCED:
+    app.add_middleware(
+        QueryStatsMiddleware,
+        headers=db_settings.QUERY_STATS,
+        enforce_budgets=db_settings.QUERY_BUDGETS_ENFORCED,
+    )
+
+# Added last so it wraps the other middleware too
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/health/db-pool", include_in_schema=False)
+def get_db_pool_stats():
+    return {"primary": get_pool_stats(), "replicas": replicas.pool_stats()}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/scalar", include_in_schema=False)
 def get_scalar_docs():
     return get_scalar_api_reference(openapi_url=app.openapi_url, title="Scalar API")
@@ -1,23 +1,31 @@
 from uuid import UUID
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import SQLModel
+from app.database.loading import LoadProfile, get_with_profile
+from app.database.unit_of_work import UnitOfWork
 
 class BaseService:
-    def __init__(self, model: SQLModel, session: AsyncSession):
-        self.session = session
+    def __init__(self, model: SQLModel, uow: UnitOfWork):
+        self.uow = uow
         self.model = model
 
-    async def _get(self, id: UUID):
-        return await self.session.get(self.model, id)
+    @property
+    def session(self):
+        # Read through the unit of work, it may move from a replica to the primary
+        return self.uow.session
+
+    async def _get(self, id: UUID, profile: LoadProfile | None = None, **kwargs):
+        return await get_with_profile(self.session, self.model, id, profile, **kwargs)
     
     async def _add(self, entity: SQLModel):
-        self.session.add(entity)
-        await self.session.commit()
-        await self.session.refresh(entity)
+        # Staged only, written by the single flush in _commit
+        self.uow.add(entity)
         return entity
     
     async def _update(self, entity: SQLModel):
         return await self._add(entity)
     
     async def _delete(self, entity: SQLModel):
-        await self.session.delete(entity)
\ No newline at end of file
+        await self.session.delete(entity)
+
+    async def _commit(self):
+        await self.uow.commit()
@@ -1,45 +1,233 @@
-from fastapi import BackgroundTasks, HTTPException, status
+from collections import Counter
+from uuid import UUID
+from fastapi import HTTPException, status
 from app.api.schemas.delivery_partner import DeliveryPartnerCreate
+from app.core.metrics import PARTNER_ASSIGNMENT_FAILURES
+from app.core.principal_cache import principal_cache
+from app.database.loading import LoadProfile
 from app.database.models import DeliveryPartner, Shipment
+from app.database.unit_of_work import UnitOfWork
+from app.services.notification import NotificationService
+from app.services.partner_routing import partner_routes
 from app.services.user import UserService
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import inspect, update
 from sqlmodel import select, any_
-from typing import Sequence
 
 class DeliveryPartnerService(UserService):
-    def __init__(self, session: AsyncSession, tasks: BackgroundTasks):
-        super().__init__(DeliveryPartner, session, tasks)
+    def __init__(self, uow: UnitOfWork, notification_service: NotificationService):
+        super().__init__(DeliveryPartner, uow, notification_service)
         
     async def add(self, delivery_partner: DeliveryPartnerCreate):
+        zip_codes = delivery_partner.serviceable_zip_codes
+        self.uow.after_commit(lambda: partner_routes.invalidate(zip_codes))
+
         return await self._add_user(
             delivery_partner.model_dump(),
             router_prefix="partner"
         )
         
-    async def get_partners_by_zipcode(self, zipcode: int) -> Sequence[DeliveryPartner]:
-        partners = await self.session.scalars(
-            select(DeliveryPartner).where(
-                zipcode == any_(DeliveryPartner.serviceable_zip_codes)
+    async def get_partner_ids_by_zipcode(self, zipcode: int) -> tuple[UUID, ...]:
+        partner_ids = partner_routes.get(zipcode)
+
+        if partner_ids is None:
+            # @> rather than ANY() so the lookup can use the GIN index
+            result = await self.session.scalars(
+                select(DeliveryPartner.id).where(
+                    DeliveryPartner.serviceable_zip_codes.contains([zipcode])
+                )
             )
-        )
-        return partners.all()
-        
+            partner_ids = tuple(result.all())
+            partner_routes.set(zipcode, partner_ids)
+
+        return partner_ids
     
+    async def get_partner_ids_by_zipcodes(
+        self, zipcodes: set[int]
+    ) -> dict[int, tuple[UUID, ...]]:
+        routes = {zipcode: partner_routes.get(zipcode) for zipcode in zipcodes}
+        missing = [zipcode for zipcode, partner_ids in routes.items() if partner_ids is None]
+
+        if missing:
+            # && lets a single GIN index scan resolve every missing zip code
+            rows = await self.session.execute(
+                select(DeliveryPartner.id, DeliveryPartner.serviceable_zip_codes).where(
+                    DeliveryPartner.serviceable_zip_codes.overlap(missing)
+                )
+            )
+            found = {zipcode: [] for zipcode in missing}
+            for partner_id, zip_codes in rows:
+                for zipcode in found.keys() & set(zip_codes):
+                    found[zipcode].append(partner_id)
+
+            for zipcode, partner_ids in found.items():
+                partner_routes.set(zipcode, partner_ids)
+                routes[zipcode] = tuple(partner_ids)
+
+        return routes
+
     async def assign_shipment(self, shipment: Shipment):
-        eligible_partners = await self.get_partners_by_zipcode(shipment.destination)
+        partner_ids = await self.get_partner_ids_by_zipcode(shipment.destination)
+        partner = None
 
-        for partner in eligible_partners:
-            if partner.current_handling_capacity > 0:
-                partner.shipments.append(shipment)
-                return partner
-        
-        raise HTTPException(
-            status_code=status.HTTP_406_NOT_ACCEPTABLE,
-            detail="No delivery partner available"
+        # First pass skips partners other requests are claiming right now,
+        # the second waits for them in case they were the only ones left
+        if partner_ids:
+            partner = await self._claim_capacity(shipment.destination, partner_ids)
+
+        if partner_ids and partner is None:
+            partner = await self._wait_for_capacity(shipment.destination, partner_ids)
+
+        if partner is None:
+            PARTNER_ASSIGNMENT_FAILURES.inc()
+            raise HTTPException(
+                status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                detail="No delivery partner available"
+            )
+
+        shipment.delivery_partner = partner
+        return partner
+
+    async def assign_shipments(
+        self, destinations: list[int]
+    ) -> list[DeliveryPartner | None]:
+        """Claim one partner slot per destination, None where none is left."""
+        demand = Counter(destinations)
+        routes = await self.get_partner_ids_by_zipcodes(set(demand))
+        partner_ids = {partner_id for ids in routes.values() for partner_id in ids}
+
+        if not partner_ids:
+            PARTNER_ASSIGNMENT_FAILURES.inc(len(destinations))
+            return [None] * len(destinations)
+
+        # Locked in primary key order so concurrent batches cannot deadlock,
+        # the locks are held until the batch commits
+        partners = (
+            await self.session.scalars(
+                select(DeliveryPartner)
+                .where(
+                    DeliveryPartner.id.in_(partner_ids),
+                    DeliveryPartner.active_shipment_count < DeliveryPartner.max_handling_capacity,
+                )
+                .order_by(DeliveryPartner.id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+        ).all()
+        partners_by_id = {partner.id: partner for partner in partners}
+
+        slots: dict[int, list[DeliveryPartner]] = {}
+
+        for zipcode, count in demand.items():
+            eligible = sorted(
+                (
+                    partners_by_id[partner_id]
+                    for partner_id in routes[zipcode]
+                    if partner_id in partners_by_id
+                    and zipcode in (partners_by_id[partner_id].serviceable_zip_codes or ())
+                ),
+                key=lambda partner: partner.active_shipment_count,
+            )
+            claimed = slots[zipcode] = []
+
+            for partner in eligible:
+                taken = min(partner.current_handling_capacity, count - len(claimed))
+                partner.active_shipment_count += taken
+                claimed.extend([partner] * taken)
+
+                if len(claimed) == count:
+                    break
+
+        assigned = [
+            slots[destination].pop() if slots[destination] else None
+            for destination in destinations
+        ]
+        PARTNER_ASSIGNMENT_FAILURES.inc(assigned.count(None))
+        return assigned
+
+    async def _claim_capacity(
+        self, zipcode: int, partner_ids: tuple[UUID, ...]
+    ) -> DeliveryPartner | None:
+        has_capacity = DeliveryPartner.active_shipment_count < DeliveryPartner.max_handling_capacity
+
+        # Rows are found by primary key, the zip code check only guards
+        # against a cached route that is stale by up to the cache TTL
+        candidate = (
+            select(DeliveryPartner.id)
+            .where(
+                DeliveryPartner.id.in_(partner_ids),
+                zipcode == any_(DeliveryPartner.serviceable_zip_codes),
+                has_capacity,
+            )
+            .order_by(DeliveryPartner.active_shipment_count)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+
+        # Capacity is re-checked on the locked row, so a partner can never
+        # be claimed past max_handling_capacity by concurrent requests
+        return await self.session.scalar(
+            update(DeliveryPartner)
+            .where(DeliveryPartner.id == candidate, has_capacity)
+            .values(active_shipment_count=DeliveryPartner.active_shipment_count + 1)
+            .returning(DeliveryPartner)
+            .execution_options(populate_existing=True)
+        )
+
+    async def _wait_for_capacity(
+        self, zipcode: int, partner_ids: tuple[UUID, ...]
+    ) -> DeliveryPartner | None:
+        # Every candidate is locked in primary key order, like assign_shipments
+        # does, so waiting claims queue up behind each other instead of
+        # deadlocking on rows picked by a count that keeps changing
+        partners = (
+            await self.session.scalars(
+                select(DeliveryPartner)
+                .where(
+                    DeliveryPartner.id.in_(partner_ids),
+                    zipcode == any_(DeliveryPartner.serviceable_zip_codes),
+                    DeliveryPartner.active_shipment_count < DeliveryPartner.max_handling_capacity,
+                )
+                .order_by(DeliveryPartner.id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+        ).all()
+
+        if not partners:
+            return None
+
+        partner = min(partners, key=lambda partner: partner.active_shipment_count)
+        partner.active_shipment_count += 1
+        return partner
+
+    async def release_shipment(self, partner_id: UUID):
+        await self.session.execute(
+            update(DeliveryPartner)
+            .where(
+                DeliveryPartner.id == partner_id,
+                DeliveryPartner.active_shipment_count > 0,
+            )
+            .values(active_shipment_count=DeliveryPartner.active_shipment_count - 1)
         )
     
-    async def update(self, partner: DeliveryPartner):
-        return await self._update(partner)
+    async def update(self, partner_id: UUID, update: dict):
+        partner = await self._get(partner_id, LoadProfile.principal_only)
+        partner.sqlmodel_update(update)
+
+        history = inspect(partner).attrs.serviceable_zip_codes.history
+        changed_zip_codes = {
+            zipcode
+            for zip_codes in (*history.added, *history.deleted)
+            for zipcode in zip_codes or ()
+        }
+
+        self.uow.after_commit(lambda: partner_routes.invalidate(changed_zip_codes))
+        self.uow.after_commit(lambda: principal_cache.invalidate_user(partner.id))
+
+        partner = await self._update(partner)
+        await self._commit()
+        return partner
         
     async def token(self, email, password) -> str:
-        return await self._generate_token(email, password)
\ No newline at end of file
+        return await self._generate_token(email, password)
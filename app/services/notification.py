@@ -1,31 +1,16 @@
-import os
-import certifi
-
-from fastapi import BackgroundTasks
-from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
 from pydantic import EmailStr
-from app.config.config import notification_settings
-from app.utils.email_util import TEMPLATE_DIR
-from twilio.rest import Client
+from pydantic_core import to_jsonable_python
+from app.core.metrics import NOTIFICATIONS_QUEUED
+from app.database.models import Notification, NotificationChannel
+from app.database.unit_of_work import UnitOfWork
 
-os.environ.setdefault("SSL_CERT_FILE", certifi.where())
-os.environ.setdefault("REQUESTS_CA_BUNDLE", certifi.where())
 
 class NotificationService:
-    def __init__(self, tasks: BackgroundTasks):
-        self.tasks = tasks
-        self.fastmail = FastMail(
-            ConnectionConfig(
-                **notification_settings.model_dump(exclude=["TWILIO_SID", "TWILIO_AUTH_TOKEN", "TWILIO_NUMBER"]),
-                TEMPLATE_FOLDER=TEMPLATE_DIR,
-            )
-        )
-        self.twilio_client = Client(
-            notification_settings.TWILIO_SID,
-            notification_settings.TWILIO_AUTH_TOKEN,
-            
-        )
+    """Queues notifications in the outbox, they are only sent by the worker
+    once the unit of work they were queued in commits"""
 
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
 
     async def send_message(
         self,
@@ -33,15 +18,11 @@ class NotificationService:
         subject: str,
         body: str,
     ):
-        self.tasks.add_task(
-            self.fastmail.send_message,
-            message=MessageSchema(
-                recipients=recipients,
-                subject=subject,
-                body=body,
-                subtype=MessageType.plain,
-            )
-        )
+        self._enqueue(NotificationChannel.email, {
+            "recipients": recipients,
+            "subject": subject,
+            "body": body,
+        })
 
     async def send_message_with_template(
         self,
@@ -50,20 +31,27 @@ class NotificationService:
         context: dict,
         template_name: str
     ):
-        self.tasks.add_task(
-            self.fastmail.send_message,
-            message=MessageSchema(
-                recipients=recipients,
-                subject=subject,
-                template_body=context,
-                subtype=MessageType.html
-            ),
-            template_name=template_name,
-        )
+        self._enqueue(NotificationChannel.email, {
+            "recipients": recipients,
+            "subject": subject,
+            "context": context,
+            "template_name": template_name,
+        })
+
+    async def send_sms(self, to: str, body: str, fallback: dict | None = None):
+        # fallback is the payload of an email queued if the sms dead-letters
+        self._enqueue(NotificationChannel.sms, {
+            "to": to,
+            "body": body,
+            "fallback": fallback,
+        })
 
-    def send_sms(self, to: str, body: str):
-        self.twilio_client.messages.create(
-            from_=notification_settings.TWILIO_NUMBER,
-            to=to,
-            body=body
+    def _enqueue(self, channel: NotificationChannel, payload: dict):
+        self.uow.add(
+            Notification(channel=channel, payload=to_jsonable_python(payload))
         )
+
+        async def count_queued():
+            NOTIFICATIONS_QUEUED.labels(channel.value).inc()
+
+        self.uow.after_commit(count_queued)
@@ -0,0 +1,70 @@
+import json
+import logging
+from time import monotonic
+from typing import Iterable
+from uuid import UUID
+from redis.exceptions import RedisError
+
+from app.config.config import db_settings
+from app.database.pubsub import subscriber
+from app.database.redis import publish
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "partner_routes:invalidate"
+
+
+class ZipCodeRoutes:
+    """Per-worker zip code -> delivery partner ids map with a TTL.
+
+    Entries are dropped across workers through Redis pub/sub whenever a
+    partner's serviceable zip codes change, the TTL bounds staleness if an
+    invalidation message is ever missed.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._routes: dict[int, tuple[float, tuple[UUID, ...]]] = {}
+
+    def get(self, zipcode: int) -> tuple[UUID, ...] | None:
+        entry = self._routes.get(zipcode)
+
+        if entry is None or entry[0] < monotonic():
+            return None
+
+        return entry[1]
+
+    def set(self, zipcode: int, partner_ids: Iterable[UUID]):
+        self._routes[zipcode] = (monotonic() + self.ttl, tuple(partner_ids))
+
+    def discard(self, zipcodes: Iterable[int]):
+        for zipcode in zipcodes:
+            self._routes.pop(zipcode, None)
+
+    def clear(self):
+        self._routes.clear()
+
+    def on_message(self, data: str):
+        self.discard(json.loads(data))
+
+    async def invalidate(self, zipcodes: Iterable[int]):
+        zipcodes = sorted(set(zipcodes))
+        if not zipcodes:
+            return
+
+        self.discard(zipcodes)
+
+        try:
+            await publish(INVALIDATION_CHANNEL, json.dumps(zipcodes))
+        except RedisError:
+            # Other workers catch up when their entries expire
+            logger.warning("Could not publish zip code invalidation", exc_info=True)
+
+
+partner_routes = ZipCodeRoutes(ttl=db_settings.ZIPCODE_ROUTES_TTL)
+
+subscriber.subscribe(
+    INVALIDATION_CHANNEL,
+    partner_routes.on_message,
+    on_reset=partner_routes.clear,
+)
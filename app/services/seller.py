@@ -1,15 +1,12 @@
-from fastapi import BackgroundTasks
-from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 from app.api.schemas.seller import SellerCreate
 from app.database.models import Seller
+from app.database.unit_of_work import UnitOfWork
+from app.services.notification import NotificationService
 from app.services.user import UserService
 
-password_context = CryptContext(schemes="bcrypt", deprecated="auto")
-
 class SellerService(UserService):
-    def __init__(self, session: AsyncSession, tasks: BackgroundTasks):
-        super().__init__(Seller, session, tasks)
+    def __init__(self, uow: UnitOfWork, notification_service: NotificationService):
+        super().__init__(Seller, uow, notification_service)
 
     async def add(self, seller_create: SellerCreate) -> Seller:
         return await self._add_user(seller_create.model_dump(), router_prefix="seller")
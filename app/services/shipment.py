@@ -1,36 +1,205 @@
+import logging
 from datetime import datetime, timedelta
-from uuid import UUID
+from typing import Sequence
+from uuid import UUID, uuid4
 
 from fastapi import HTTPException, status
-from app.api.schemas.shipment import ShipmentCreate, ShipmentUpdate
-from app.database.models import DeliveryPartner, Seller, Shipment, ShipmentStatus
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.database.redis import get_shipment_verification_codes
+from redis.exceptions import RedisError
+from sqlalchemy import and_, select, tuple_
+from app.api.schemas.shipment import (
+    ShipmentBatchItem,
+    ShipmentBatchResult,
+    ShipmentCreate,
+    ShipmentListQuery,
+    ShipmentEventView,
+    ShipmentUpdate,
+    ShipmentView,
+)
+from app.database.models import (
+    TERMINAL_STATUSES,
+    Seller,
+    Shipment,
+    ShipmentEvent,
+    ShipmentStatus,
+)
+from app.config.config import security_settings
+from app.core.principal_cache import Principal
+from app.database.loading import (
+    LoadProfile,
+    load_options,
+    timeline_criteria,
+)
+from app.database.redis import (
+    CodeCheck,
+    check_shipment_verification_code,
+    delete_shipment_verification_code,
+)
+from app.database.unit_of_work import UnitOfWork
 from app.services.base import BaseService
 from app.services.delivery_partner import DeliveryPartnerService
 from app.services.shipment_event import ShipmentEventService
+from app.utils.conditional import Validator
+from app.utils.pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
 
 
 class ShipmentService(BaseService):
     def __init__(
         self,
-        session: AsyncSession,
+        uow: UnitOfWork,
         partner_service: DeliveryPartnerService,
         event_service: ShipmentEventService,
     ):
-        super().__init__(Shipment, session)
+        super().__init__(Shipment, uow)
         self.partner_service = partner_service
         self.event_service = event_service
 
-    async def get(self, id: UUID) -> Shipment:
-        return await self._get(id)
+    async def get(
+        self, id: UUID, profile: LoadProfile = LoadProfile.shipment_with_timeline
+    ) -> Shipment:
+        return await self._get(id, profile)
+
+    async def _get_for_update(self, id: UUID) -> Shipment:
+        # The row lock is held until commit, so concurrent status changes of
+        # one shipment see each other and its partner slot moves only once
+        shipment = await self._get(
+            id,
+            LoadProfile.shipment_with_timeline,
+            with_for_update={"of": Shipment},
+            populate_existing=True,
+        )
+
+        if shipment is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Shipment not found"
+            )
+
+        return shipment
+
+    def _check_not_final(self, shipment: Shipment):
+        # Leaving delivered/cancelled would need the released slot back
+        if shipment.current_status in TERMINAL_STATUSES:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Shipment is already {shipment.current_status.value}",
+            )
+
+    async def get_view(self, id: UUID) -> ShipmentView | None:
+        # Plain row tuples, no ORM identity map or relationship loading. The
+        # shipment and its timeline come back in one round trip, one row per
+        # event with the shipment columns repeated.
+        rows = (
+            await self.session.execute(
+                select(*ShipmentView.columns, *ShipmentEventView.columns)
+                .outerjoin(ShipmentEvent, and_(*timeline_criteria(id, Shipment.created_at)))
+                .where(Shipment.id == id)
+                .order_by(ShipmentEvent.created_at)
+            )
+        ).all()
+
+        if not rows:
+            return None
+
+        split = len(ShipmentView.columns)
+        return ShipmentView.from_rows(
+            rows[0][:split],
+            [row[split:] for row in rows if row[split] is not None],
+        )
+
+    async def get_validator(self, id: UUID) -> Validator | None:
+        # Primary key lookup of the materialized columns, no timeline or joins
+        statement = select(
+            Shipment.updated_at,
+            Shipment.current_status,
+            Shipment.estimated_delivery,
+        ).where(Shipment.id == id)
+
+        row = (await self.session.execute(statement)).one_or_none()
+
+        # A replica may not have the shipment yet, the rest of the request
+        # then reads from the primary
+        if row is None and await self.uow.use_primary():
+            row = (await self.session.execute(statement)).one_or_none()
+
+        if row is None:
+            return None
+
+        return Validator.of(row.updated_at, row.current_status, row.estimated_delivery)
+
+    async def list_for_seller(
+        self, seller: Principal, query: ShipmentListQuery
+    ) -> tuple[Sequence[Shipment], str | None]:
+        return await self._list(Shipment.seller_id == seller.id, query)
+
+    async def list_for_partner(
+        self, partner: Principal, query: ShipmentListQuery
+    ) -> tuple[Sequence[Shipment], str | None]:
+        return await self._list(Shipment.delivery_partner_id == partner.id, query)
+
+    async def _list(
+        self, owner_clause, query: ShipmentListQuery
+    ) -> tuple[Sequence[Shipment], str | None]:
+        statement = select(Shipment).where(owner_clause)
+
+        if query.status is not None:
+            statement = statement.where(Shipment.current_status == query.status)
+        if query.created_after is not None:
+            statement = statement.where(Shipment.created_at >= query.created_after)
+        if query.created_before is not None:
+            statement = statement.where(Shipment.created_at < query.created_before)
+
+        if query.cursor is not None:
+            cursor = decode_cursor(query.cursor)
+
+            if cursor is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+                )
+
+            # Row comparison keeps this a range scan on the (owner, created_at, id) index
+            statement = statement.where(tuple_(Shipment.created_at, Shipment.id) < cursor)
+
+        # One extra row tells whether there is a next page
+        shipments = (
+            await self.session.scalars(
+                statement.order_by(Shipment.created_at.desc(), Shipment.id.desc())
+                .limit(query.limit + 1)
+            )
+        ).all()
+
+        if len(shipments) <= query.limit:
+            return shipments, None
+
+        shipments = shipments[: query.limit]
+        return shipments, encode_cursor(shipments[-1].created_at, shipments[-1].id)
+
+    async def _get_seller(self, principal: Principal) -> Seller:
+        # New shipments reference the seller row and notifications need its name
+        seller = await self.session.get(
+            Seller, principal.id, options=load_options(LoadProfile.principal_only)
+        )
+
+        if seller is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized"
+            )
+
+        return seller
+
+    async def add(self, shipment_create: ShipmentCreate, principal: Principal) -> Shipment:
+        seller = await self._get_seller(principal)
+        now = datetime.now()
 
-    async def add(self, shipment_create: ShipmentCreate, seller: Seller) -> Shipment:
         new_shipment = Shipment(
             **shipment_create.model_dump(),
-            status=ShipmentStatus.placed,
-            estimated_delivery=datetime.now() + timedelta(days=3),
-            seller_id=seller.id,
+            # Generated here, the placed email is queued before the flush
+            id=uuid4(),
+            # Set before its first event, timelines are read from created_at on
+            created_at=now,
+            estimated_delivery=now + timedelta(days=3),
+            seller=seller,
+            timeline=[],
         )
 
         partner = await self.partner_service.assign_shipment(new_shipment)
@@ -46,56 +215,168 @@ class ShipmentService(BaseService):
 
         shipment.timeline.append(event)
 
+        # Shipment, placed event and partner counter land in one transaction
+        await self._commit()
+
         return shipment
 
+    async def add_many(
+        self, shipments_create: list[ShipmentCreate], principal: Principal
+    ) -> ShipmentBatchResult:
+        seller = await self._get_seller(principal)
+        partners = await self.partner_service.assign_shipments(
+            [shipment.destination for shipment in shipments_create]
+        )
+
+        now = datetime.now()
+        estimated_delivery = now + timedelta(days=3)
+        shipments: list[Shipment] = []
+        results: list[ShipmentBatchItem] = []
+
+        for index, (shipment_create, partner) in enumerate(zip(shipments_create, partners)):
+            if partner is None:
+                results.append(
+                    ShipmentBatchItem(index=index, error="No delivery partner available")
+                )
+                continue
+
+            shipment = Shipment(
+                **shipment_create.model_dump(),
+                id=uuid4(),
+                created_at=now,
+                estimated_delivery=estimated_delivery,
+                seller=seller,
+                delivery_partner=partner,
+                timeline=[],
+            )
+            shipment.timeline.append(
+                self.event_service.build(
+                    shipment=shipment,
+                    location=seller.zip_code,
+                    status=ShipmentStatus.placed,
+                    description=f"assigned to {partner.name}",
+                )
+            )
+
+            shipments.append(shipment)
+            results.append(ShipmentBatchItem(index=index, id=shipment.id))
+
+        # Shipments, events and their outbox notifications go out as
+        # multi-row INSERTs together with the partner counters, all in one
+        # transaction
+        self.uow.add_all(shipments)
+        await self.event_service.notify_many(shipments, ShipmentStatus.placed)
+        await self._commit()
+
+        return ShipmentBatchResult(
+            created=len(shipments),
+            failed=len(results) - len(shipments),
+            results=results,
+        )
+
     async def update(
-        self, id: UUID, shipment_update: ShipmentUpdate, partner: DeliveryPartner
+        self, id: UUID, shipment_update: ShipmentUpdate, partner: Principal
     ) -> Shipment:
 
-        shipment = await self.get(id)
+        shipment = await self._get_for_update(id)
 
         if shipment.delivery_partner_id != partner.id:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized"
             )
 
-        if shipment_update.status == ShipmentStatus.delivered:
-            code = await get_shipment_verification_codes(shipment.id)
+        if shipment_update.status is not None or shipment_update.location is not None:
+            self._check_not_final(shipment)
 
-            if code != shipment_update.verification_code:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Client not authorized.",
-                )
+        if shipment_update.status == ShipmentStatus.delivered:
+            await self._check_verification_code(shipment, shipment_update.verification_code)
 
         update = shipment_update.model_dump(
             exclude_none=True,
-            exclude=["verification_code"]
+            exclude=["verification_code", "estimated_delivery"]
         )
 
         if shipment_update.estimated_delivery is not None:
             shipment.estimated_delivery = shipment_update.estimated_delivery
 
-        if len(update) > 1 or not shipment_update.estimated_delivery:
-            await self.event_service.add(shipment=shipment, **update)
+        if update:
+            previous_status = shipment.current_status
+            event = await self.event_service.add(shipment=shipment, **update)
+            shipment.timeline.append(event)
+            await self._release_partner(shipment, previous_status, event.status)
+
+        await self._update(shipment)
+        await self._commit()
+
+        return shipment
 
-        return await self._update(shipment)
+    async def _check_verification_code(self, shipment: Shipment, code: str | None):
+        result = CodeCheck.missing
+        if code:
+            result, retry_after = await check_shipment_verification_code(
+                shipment.id,
+                code,
+                max_attempts=security_settings.VERIFICATION_CODE_MAX_ATTEMPTS,
+                lockout=security_settings.VERIFICATION_CODE_LOCKOUT,
+            )
 
-    async def cancel(self, id: UUID, seller) -> None:
-        shipment = await self.get(id)
+        if result == CodeCheck.locked:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many wrong verification codes, try again later.",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+        if result != CodeCheck.valid:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Client not authorized.",
+            )
+
+        # Used once: the locked shipment row lets only one delivery through,
+        # and a delivery that rolls back leaves the code for its retry
+        async def consume():
+            try:
+                await delete_shipment_verification_code(shipment.id)
+            except RedisError:
+                logger.warning("Could not delete a used verification code", exc_info=True)
+
+        self.uow.after_commit(consume)
+
+    async def cancel(self, id: UUID, seller: Principal) -> Shipment:
+        shipment = await self._get_for_update(id)
 
         if shipment.seller_id != seller.id:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized"
             )
 
+        self._check_not_final(shipment)
+
+        previous_status = shipment.current_status
         event = await self.event_service.add(
             shipment=shipment, status=ShipmentStatus.cancelled
         )
 
         shipment.timeline.append(event)
+        await self._release_partner(shipment, previous_status, event.status)
+
+        await self._update(shipment)
+        await self._commit()
 
         return shipment
 
+    async def _release_partner(
+        self,
+        shipment: Shipment,
+        previous_status: ShipmentStatus | None,
+        new_status: ShipmentStatus,
+    ):
+        # Only the transition into delivered/cancelled frees a partner slot,
+        # the shipment row is locked and final statuses are never left
+        if new_status in TERMINAL_STATUSES and previous_status not in TERMINAL_STATUSES:
+            await self.partner_service.release_shipment(shipment.delivery_partner_id)
+
     async def delete(self, id: UUID) -> None:
-        await self._delete(await self.get(id))
+        await self._delete(await self.get(id, LoadProfile.shipment_summary))
+        await self._commit()
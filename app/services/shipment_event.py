@@ -1,13 +1,18 @@
-from random import randint
+from datetime import datetime
+from secrets import randbelow
+from app.api.schemas.shipment import ShipmentEventView
+from app.config.config import security_settings
 from app.database.models import Shipment, ShipmentEvent, ShipmentStatus
+from app.database.unit_of_work import UnitOfWork
 from app.database.redis import add_shipment_verification_code
 from app.services.base import BaseService
 from app.services.notification import NotificationService
+from app.services.shipment_stream import shipment_streams
 
 class ShipmentEventService(BaseService):
-    def __init__(self, session, tasks):
-        super().__init__(ShipmentEvent, session)
-        self.notification_service = NotificationService(tasks)
+    def __init__(self, uow: UnitOfWork, notification_service: NotificationService):
+        super().__init__(ShipmentEvent, uow)
+        self.notification_service = notification_service
 
     async def add(
         self,
@@ -16,29 +21,45 @@ class ShipmentEventService(BaseService):
         status: ShipmentStatus = None,
         description: str = None,
     ):
-        if not location or not status:
-            last_event = await self.get_latest_event(shipment)
-            location = location if location else last_event.location
-            status = status if status else last_event.status
+        new_event = self.build(shipment, location, status, description)
+        
+        await self._notify(shipment, new_event.status)
+
+        # Live tracking streams only hear about committed events
+        self.uow.after_commit(
+            lambda: shipment_streams.publish(ShipmentEventView.from_event(new_event))
+        )
+
+        return await self._add(new_event)
+
+    def build(
+        self,
+        shipment: Shipment,
+        location: int = None,
+        status: ShipmentStatus = None,
+        description: str = None,
+    ) -> ShipmentEvent:
+        location = location if location else shipment.current_location
+        status = status if status else shipment.current_status
 
         new_event = ShipmentEvent(
+            created_at=datetime.now(),
             location=location,
             status=status,
             description=description if description else self._generate_description(status, location),
             shipment_id=shipment.id
         )
-        
-        await self._notify(shipment, status)
-        
-        return await self._add(new_event)
-    
-    async def get_latest_event(self, shipment: Shipment):
-        timeline = sorted(
-            shipment.timeline or [],
-            key=lambda item: item.created_at,
-        )
 
-        return timeline[-1] if timeline else None
+        # Flushed in the same commit as the event itself
+        shipment.current_status = new_event.status
+        shipment.current_location = new_event.location
+        shipment.last_event_at = new_event.created_at
+
+        return new_event
+
+    async def notify_many(self, shipments: list[Shipment], status: ShipmentStatus):
+        for shipment in shipments:
+            await self._notify(shipment, status)
 
     def _generate_description(self, status: ShipmentStatus, location: int):
         match status:
@@ -70,18 +91,26 @@ class ShipmentEventService(BaseService):
                 subject="Your order is out for delivery 🛵"
                 template_name = "mail_out_for_delivery.html"
 
-                code = randint(100_000, 999_999)
-                await add_shipment_verification_code(shipment.id, code)
+                code = 100_000 + randbelow(900_000)
+                await add_shipment_verification_code(
+                    shipment.id, code, ttl=security_settings.VERIFICATION_CODE_TTL
+                )
 
                 if shipment.client_contact_phone:
-                    try:
-                        self.notification_service.send_sms(
-                            to=shipment.client_contact_phone,
-                            body=f"Your order is arriving soon! Share the {code} code with your"
-                            "delivery executive to receive your package."
-                        )
-                    except Exception:
-                        context["verification_code"] = code
+                    # The worker mails the code instead if the sms dead-letters
+                    await self.notification_service.send_sms(
+                        to=shipment.client_contact_phone,
+                        body=f"Your order is arriving soon! Share the {code} code with your"
+                        "delivery executive to receive your package.",
+                        fallback={
+                            "recipients": [shipment.client_contact_email],
+                            "subject": subject,
+                            "context": self._email_context(
+                                shipment, verification_code=code
+                            ),
+                            "template_name": template_name,
+                        },
+                    )
 
                 else:
                     context["verification_code"] = code
@@ -93,13 +122,17 @@ class ShipmentEventService(BaseService):
                 subject="Your order was delivered ✅"
                 template_name = "mail_delivered.html"
         
-        context["id"] = shipment.id
-        context["seller"] = shipment.seller.name
-        context["partner"] = shipment.delivery_partner.name
-
         await self.notification_service.send_message_with_template(
             recipients=[shipment.client_contact_email],
             subject=subject,
-            context=context,
+            context=self._email_context(shipment, **context),
             template_name=template_name
-        )
\ No newline at end of file
+        )
+
+    def _email_context(self, shipment: Shipment, **context) -> dict:
+        return {
+            **context,
+            "id": shipment.id,
+            "seller": shipment.seller.name,
+            "partner": shipment.delivery_partner.name,
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import Enum
+from uuid import UUID
+
+import orjson
+from redis.exceptions import RedisError
+from sqlalchemy import Select, func, literal_column, select
+
+from app.api.schemas.shipment import ShipmentEventView
+from app.config.config import app_settings
+from app.database.loading import timeline_criteria
+from app.database.models import TERMINAL_STATUSES, Shipment, ShipmentEvent
+from app.database.pubsub import subscriber
+from app.database.redis import publish
+from app.database.session import async_session
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "shipment:events"
+
+# Queued to a listener when it may have missed events
+RESYNC = object()
+
+
+class StreamState(str, Enum):
+    missing = "missing"
+    # Terminal status and nothing left to replay
+    finished = "finished"
+    live = "live"
+
+
+@dataclass(frozen=True, slots=True)
+class StreamEvent:
+    id: str
+    data: str
+    terminal: bool
+
+
+class ShipmentStreams:
+    """Per-worker fan-out of new timeline events to live clients.
+
+    Every event is published once on a single Redis channel, the shared
+    subscriber hands it to the local listeners of that shipment. A listener
+    that falls behind or sits through a pub/sub reconnect is resynced from
+    the database, as is a client resuming after its Last-Event-ID.
+    """
+
+    def __init__(self, heartbeat: float, buffer: int):
+        self.heartbeat = heartbeat
+        self.buffer = buffer
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+
+    async def publish(self, event: ShipmentEventView):
+        try:
+            await publish(EVENTS_CHANNEL, orjson.dumps(event).decode())
+        except RedisError:
+            # Live clients pick it up on their next resync or reconnect
+            logger.warning("Could not publish shipment event", exc_info=True)
+
+    def on_message(self, data: str):
+        event = orjson.loads(data)
+
+        for queue in self._listeners.get(event["shipment_id"], ()):
+            self._put(queue, self._stream_event(event["id"], event["status"], data))
+
+    def on_reset(self):
+        for queues in self._listeners.values():
+            for queue in queues:
+                self._put(queue, RESYNC)
+
+    def _put(self, queue: asyncio.Queue, item):
+        if queue.full():
+            # Drop the backlog, the listener reads it back from the database
+            while not queue.empty():
+                queue.get_nowait()
+            item = RESYNC
+
+        queue.put_nowait(item)
+
+    @asynccontextmanager
+    async def _listen(self, shipment_id: UUID):
+        key = str(shipment_id)
+        queue = asyncio.Queue(maxsize=self.buffer)
+        self._listeners.setdefault(key, set()).add(queue)
+
+        try:
+            yield queue
+        finally:
+            queues = self._listeners[key]
+            queues.discard(queue)
+            if not queues:
+                del self._listeners[key]
+
+    async def state(self, shipment_id: UUID, after: UUID | None = None) -> StreamState:
+        """What a client resuming after `after` would be streamed"""
+        async with async_session() as session:
+            row = (
+                await session.execute(
+                    select(
+                        Shipment.current_status,
+                        self._events_after(shipment_id, after).exists(),
+                    ).where(Shipment.id == shipment_id)
+                )
+            ).first()
+
+        if row is None:
+            return StreamState.missing
+
+        status, has_events = row
+        if status in TERMINAL_STATUSES and not has_events:
+            return StreamState.finished
+
+        return StreamState.live
+
+    async def follow(
+        self, shipment_id: UUID, last_event_id: UUID | None = None
+    ) -> AsyncIterator[StreamEvent | None]:
+        """Events after `last_event_id` (the whole timeline without one),
+        then live events until the shipment reaches a terminal status.
+        Yields None when a heartbeat is due."""
+        seen: set[str] = set()
+
+        # Listening before the replay query, so nothing lands in between
+        async with self._listen(shipment_id) as queue:
+            pending = await self._replay(shipment_id, last_event_id)
+
+            # Resumed after the terminal event, no more events will come
+            if not pending and (
+                await self.state(shipment_id, last_event_id) is StreamState.finished
+            ):
+                return
+
+            while True:
+                for event in pending:
+                    if event.id in seen:
+                        continue
+
+                    seen.add(event.id)
+                    last_event_id = UUID(event.id)
+                    yield event
+
+                    if event.terminal:
+                        return
+
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except TimeoutError:
+                    pending = []
+                    yield None
+                    continue
+
+                if item is RESYNC:
+                    pending = await self._replay(shipment_id, last_event_id)
+                else:
+                    pending = [item]
+
+    def _events_after(self, shipment_id: UUID, after: UUID | None) -> Select:
+        shipment_created_at = (
+            select(Shipment.created_at).where(Shipment.id == shipment_id).scalar_subquery()
+        )
+        statement = (
+            select(*ShipmentEventView.columns)
+            .where(*timeline_criteria(shipment_id, shipment_created_at))
+            .order_by(ShipmentEvent.created_at)
+        )
+
+        if after is not None:
+            # An unknown id replays the whole timeline
+            statement = statement.where(
+                ShipmentEvent.created_at > func.coalesce(
+                    select(ShipmentEvent.created_at)
+                    .where(ShipmentEvent.id == after)
+                    .scalar_subquery(),
+                    literal_column("'-infinity'::timestamp"),
+                )
+            )
+
+        return statement
+
+    async def _replay(
+        self, shipment_id: UUID, after: UUID | None
+    ) -> list[StreamEvent]:
+        statement = self._events_after(shipment_id, after)
+
+        # A short session of its own, streams outlive the request's
+        async with async_session() as session:
+            rows = (await session.execute(statement)).all()
+
+        return [
+            self._stream_event(
+                str(row.id), row.status, orjson.dumps(ShipmentEventView(*row)).decode()
+            )
+            for row in rows
+        ]
+
+    def _stream_event(self, id: str, status: str, data: str) -> StreamEvent:
+        return StreamEvent(id=id, data=data, terminal=status in TERMINAL_STATUSES)
+
+
+shipment_streams = ShipmentStreams(
+    heartbeat=app_settings.SHIPMENT_STREAM_HEARTBEAT,
+    buffer=app_settings.SHIPMENT_STREAM_BUFFER,
+)
+
+subscriber.subscribe(
+    EVENTS_CHANNEL,
+    shipment_streams.on_message,
+    on_reset=shipment_streams.on_reset,
+)
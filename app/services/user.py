@@ -1,26 +1,26 @@
 from datetime import timedelta
-from uuid import UUID
-from fastapi import BackgroundTasks, HTTPException, status
+from uuid import UUID, uuid4
+from fastapi import HTTPException, status
 from pydantic import EmailStr
 from sqlalchemy import select
+from app.core.passwords import password_hasher
+from app.core.principal_cache import principal_cache
+from app.database.loading import LoadProfile
 from app.database.models import User
+from app.database.unit_of_work import UnitOfWork
 from app.services.base import BaseService
-from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 from app.services.notification import NotificationService
 from app.utils.verification import decode_url_safe_token, generate_url_safe_token
 from app.config.config import app_settings
 
 from app.utils.jwt_token import generate_access_token
 
-password_context = CryptContext(schemes="bcrypt", deprecated="auto")
-
-
 class UserService(BaseService):
-    def __init__(self, model: User, session: AsyncSession, tasks: BackgroundTasks):
-        self.model = model
-        self.session = session
-        self.notification_service = NotificationService(tasks)
+    def __init__(
+        self, model: User, uow: UnitOfWork, notification_service: NotificationService
+    ):
+        super().__init__(model, uow)
+        self.notification_service = notification_service
 
     async def _get_by_email(self, email) -> User | None:
         return await self.session.scalar(
@@ -30,12 +30,13 @@ class UserService(BaseService):
     async def _add_user(self, data: dict, router_prefix: str):
         user = self.model(
             **data,
-            password_hash=password_context.hash(data["password"]),
+            id=uuid4(),
+            password_hash=await password_hasher.hash(data["password"]),
             email_verified=False
         )
 
         user = await self._add(user)
-        
+
         token = generate_url_safe_token({
             "email": user.email,
             "id": str(user.id)
@@ -51,6 +52,9 @@ class UserService(BaseService):
             template_name="mail_email_verify.html"
         )
 
+        # The user and its verification email commit together
+        await self._commit()
+
         return user
 
 
@@ -64,7 +68,11 @@ class UserService(BaseService):
                 detail="Seller email not found"
             )
         
-        if not password_context.verify(password, user.password_hash):
+        is_valid, new_hash = await password_hasher.verify_and_update(
+            password, user.password_hash
+        )
+
+        if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid credentials"
@@ -76,6 +84,12 @@ class UserService(BaseService):
                 detail="Not authorized"
             )
         
+        # Stored with the current cost settings now that we have the password
+        if new_hash is not None:
+            user.password_hash = new_hash
+            await self._update(user)
+            await self._commit()
+        
         return generate_access_token(data={
             "user": {
                 "name": user.name,
@@ -99,6 +113,7 @@ class UserService(BaseService):
             },
             template_name="mail_reset_password.html"
         )
+        await self._commit()
 
     async def reset_password(self, token: str, password: str) -> bool:
         token_data = decode_url_safe_token(
@@ -110,10 +125,12 @@ class UserService(BaseService):
         if not token_data:
             return False
 
-        user = await self._get(UUID(token_data["id"]))
-        user.password_hash = password_context.hash(password)
+        user = await self._get(UUID(token_data["id"]), LoadProfile.principal_only)
+        user.password_hash = await password_hasher.hash(password)
 
+        self.uow.after_commit(lambda: principal_cache.invalidate_user(user.id))
         await self._update(user)
+        await self._commit()
 
         return True
 
@@ -126,7 +143,9 @@ class UserService(BaseService):
                 detail="Invalid token"
             )
         
-        user = await self._get(UUID(token_data["id"]))
+        user = await self._get(UUID(token_data["id"]), LoadProfile.principal_only)
         user.email_verified = True
 
+        self.uow.after_commit(lambda: principal_cache.invalidate_user(user.id))
         await self._update(user)
+        await self._commit()
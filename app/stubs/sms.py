@@ -0,0 +1,38 @@
+"""Local stand-in for the Twilio Messages API.
+
+    uvicorn app.stubs.sms:app --port 8025
+
+and set SMS_API_URL=http://localhost:8025/Messages.json. FAILURE_RATE makes
+a share of the requests fail to exercise retries.
+"""
+import os
+from random import random
+from uuid import uuid4
+
+from fastapi import FastAPI, Form, HTTPException, status
+
+FAILURE_RATE = float(os.environ.get("FAILURE_RATE", "0"))
+
+app = FastAPI(title="SMS stub")
+
+messages: list[dict] = []
+
+
+@app.post("/Messages.json", status_code=status.HTTP_201_CREATED)
+async def create_message(
+    To: str = Form(),
+    From: str = Form(),
+    Body: str = Form(),
+):
+    if random() < FAILURE_RATE:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    message = {"sid": uuid4().hex, "to": To, "from": From, "body": Body, "status": "queued"}
+    messages.append(message)
+
+    return message
+
+
+@app.get("/Messages.json")
+async def list_messages():
+    return {"messages": messages}
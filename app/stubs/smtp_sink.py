@@ -0,0 +1,86 @@
+"""Local SMTP server that accepts everything and logs what it receives.
+
+    python -m app.stubs.smtp_sink [--port 1025]
+
+Point MAIL_SERVER/MAIL_PORT at it with MAIL_STARTTLS=false and
+USE_CREDENTIALS=false.
+"""
+import argparse
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+received = 0
+
+
+async def _reply(writer: asyncio.StreamWriter, line: str):
+    writer.write(f"{line}\r\n".encode())
+    await writer.drain()
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    global received
+    sender, recipients = None, []
+
+    await _reply(writer, "220 smtp-sink ready")
+
+    try:
+        while line := await reader.readline():
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            match verb:
+                case "EHLO":
+                    await _reply(writer, "250-smtp-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                case "HELO" | "NOOP":
+                    await _reply(writer, "250 OK")
+                case "AUTH":
+                    if command.upper().startswith("AUTH LOGIN") and len(command.split()) == 2:
+                        await _reply(writer, "334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await _reply(writer, "334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    await _reply(writer, "235 Authentication successful")
+                case "MAIL":
+                    sender, recipients = command[10:].strip().split(" ", 1)[0], []
+                    await _reply(writer, "250 OK")
+                case "RCPT":
+                    recipients.append(command[8:].strip())
+                    await _reply(writer, "250 OK")
+                case "DATA":
+                    await _reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    size = 0
+                    while (data := await reader.readline()) not in (b".\r\n", b""):
+                        size += len(data)
+                    received += 1
+                    logger.info("#%d %s -> %s (%d bytes)", received, sender, ", ".join(recipients), size)
+                    await _reply(writer, "250 OK queued")
+                case "RSET":
+                    sender, recipients = None, []
+                    await _reply(writer, "250 OK")
+                case "QUIT":
+                    await _reply(writer, "221 Bye")
+                    break
+                case _:
+                    await _reply(writer, "502 Command not implemented")
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(_handle, host, port)
+    logger.info("SMTP sink listening on %s:%d", host, port)
+
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.host, args.port))
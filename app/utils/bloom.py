@@ -0,0 +1,31 @@
+from hashlib import blake2b
+from math import ceil, log
+
+
+class BloomFilter:
+    """Fixed size Bloom filter, no false negatives and `error_rate` false
+    positives once `capacity` items have been added."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = ceil(-capacity * log(error_rate) / log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+
+        # Double hashing, k positions out of two 64-bit hashes
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
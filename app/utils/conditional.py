@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+
+from fastapi import Request
+
+
+@dataclass(frozen=True)
+class Validator:
+    etag: str
+    last_modified: datetime | None
+
+    @classmethod
+    def of(cls, last_modified: datetime | None, *parts) -> "Validator":
+        digest = blake2b(
+            "|".join(str(part) for part in (last_modified, *parts)).encode(),
+            digest_size=12,
+        ).hexdigest()
+        return cls(etag=f'"{digest}"', last_modified=last_modified)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        # Cached copies must be revalidated, which is the cheap path
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(
+                self.last_modified.astimezone(timezone.utc), usegmt=True
+            )
+
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """Whether the client's copy is current, If-None-Match wins over
+        If-Modified-Since as per RFC 9110"""
+        if_none_match = request.headers.get("if-none-match")
+
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+
+        if if_modified_since is None or self.last_modified is None:
+            return False
+
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+        # HTTP dates have second resolution
+        modified = self.last_modified.astimezone(timezone.utc).replace(microsecond=0)
+        return since.tzinfo is not None and modified <= since
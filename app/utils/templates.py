@@ -0,0 +1,42 @@
+from time import perf_counter
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
+
+from app.config.config import app_settings
+from app.core.metrics import add_time
+from app.utils.email_util import TEMPLATE_DIR
+
+app_settings.TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs) -> str:
+        start = perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            add_time("template", perf_counter() - start)
+
+
+# One environment per process for pages and emails. Templates ship with the
+# app so they are never re-checked on disk, and compiled bytecode is cached
+# across restarts.
+template_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(),
+    bytecode_cache=FileSystemBytecodeCache(str(app_settings.TEMPLATE_CACHE_DIR)),
+    auto_reload=False,
+    cache_size=-1,
+)
+template_env.template_class = TimedTemplate
+
+templates = Jinja2Templates(env=template_env)
+
+
+def precompile_templates() -> list[str]:
+    names = template_env.list_templates(extensions=["html"])
+
+    for name in names:
+        template_env.get_template(name)
+
+    return names
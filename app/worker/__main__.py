@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import signal
+
+from prometheus_client import start_http_server
+
+from app.config.config import notification_settings, outbox_settings
+from app.database.models import NotificationChannel
+from app.database.session import engine
+from app.utils.templates import precompile_templates
+from app.worker.outbox import OutboxWorker
+from app.worker.transports import EmailTransport, SmsTransport, SmtpPool, sms_client
+
+
+async def main():
+    precompile_templates()
+
+    if outbox_settings.OUTBOX_METRICS_PORT is not None:
+        start_http_server(outbox_settings.OUTBOX_METRICS_PORT)
+
+    # Transports are built once per process and shared by every send
+    smtp_pool = SmtpPool(notification_settings.MAIL_POOL_SIZE)
+    http_client = sms_client()
+
+    worker = OutboxWorker({
+        NotificationChannel.email: EmailTransport(smtp_pool),
+        NotificationChannel.sms: SmsTransport(http_client),
+    })
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await smtp_pool.close()
+        await http_client.aclose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
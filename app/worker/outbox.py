@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime, timedelta
+from random import uniform
+from typing import Protocol
+from uuid import UUID
+
+from sqlalchemy import TEXT, delete, update
+from sqlalchemy.dialects import postgresql
+from sqlmodel import select
+
+from app.config.config import outbox_settings, security_settings
+from app.core.metrics import NOTIFICATIONS_FAILED, NOTIFICATIONS_SENT
+from app.database.models import Notification, NotificationChannel, NotificationStatus
+from app.database.session import async_session
+
+logger = logging.getLogger(__name__)
+
+
+# Dropped from a payload once it is sent or dead, message bodies and
+# template contexts may hold delivery verification codes
+_CONTENT_FIELDS = ("body", "context", "fallback")
+
+
+def redacted(payload: dict) -> dict:
+    return {key: value for key, value in payload.items() if key not in _CONTENT_FIELDS}
+
+
+class Transport(Protocol):
+    async def send(self, payload: dict): ...
+
+
+class OutboxWorker:
+    """Drains the notification outbox.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED and leased by pushing their
+    next_attempt_at forward, so any number of workers can run side by side and
+    a row whose worker died is picked up again once the lease runs out.
+    Delivery is at least once.
+    """
+
+    def __init__(self, transports: dict[NotificationChannel, Transport]):
+        self.transports = transports
+        self._in_flight: set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        purge_due = 0.0
+
+        while not self._stopping.is_set():
+            loop_time = asyncio.get_running_loop().time()
+            if loop_time >= purge_due:
+                purge_due = loop_time + outbox_settings.OUTBOX_PURGE_INTERVAL
+                await self._purge()
+
+            free = outbox_settings.OUTBOX_CONCURRENCY - len(self._in_flight)
+
+            if free <= 0:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            try:
+                notifications = await self._claim(min(free, outbox_settings.OUTBOX_BATCH_SIZE))
+            except Exception:
+                logger.exception("Could not claim outbox notifications")
+                notifications = []
+
+            for notification in notifications:
+                task = asyncio.create_task(self._deliver(notification))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            if not notifications:
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        self._stopping.wait(), outbox_settings.OUTBOX_POLL_INTERVAL
+                    )
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _claim(self, limit: int) -> list[Notification]:
+        now = datetime.now()
+
+        async with async_session() as session:
+            notifications = (
+                await session.scalars(
+                    select(Notification)
+                    .where(
+                        Notification.status == NotificationStatus.pending,
+                        Notification.next_attempt_at <= now,
+                    )
+                    .order_by(Notification.next_attempt_at)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+
+            for notification in notifications:
+                notification.next_attempt_at = now + timedelta(
+                    seconds=outbox_settings.OUTBOX_LEASE
+                )
+
+            await session.commit()
+
+        return list(notifications)
+
+    async def _deliver(self, notification: Notification):
+        try:
+            await self.transports[notification.channel].send(notification.payload)
+        except Exception as error:
+            await self._failed(notification, error)
+        else:
+            NOTIFICATIONS_SENT.labels(notification.channel.value).inc()
+            await self._record(
+                notification.id,
+                status=NotificationStatus.sent,
+                payload=redacted(notification.payload),
+            )
+
+    async def _failed(self, notification: Notification, error: Exception):
+        attempts = notification.attempts + 1
+
+        if attempts >= outbox_settings.OUTBOX_MAX_ATTEMPTS:
+            NOTIFICATIONS_FAILED.labels(notification.channel.value, "dead").inc()
+            logger.error(
+                "Dead-lettering %s notification %s after %d attempts: %r",
+                notification.channel.value, notification.id, attempts, error,
+            )
+            fallback = notification.payload.get("fallback")
+            await self._record(
+                notification.id,
+                fallback=fallback,
+                status=NotificationStatus.dead,
+                payload=redacted(notification.payload),
+                attempts=attempts,
+                last_error=repr(error),
+            )
+            return
+
+        delay = min(
+            outbox_settings.OUTBOX_BACKOFF_MAX,
+            outbox_settings.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1),
+        )
+        NOTIFICATIONS_FAILED.labels(notification.channel.value, "retry").inc()
+        logger.warning(
+            "Sending %s notification %s failed (attempt %d), retrying in %.0fs: %r",
+            notification.channel.value, notification.id, attempts, delay, error,
+        )
+        await self._record(
+            notification.id,
+            attempts=attempts,
+            last_error=repr(error),
+            # Jittered so a failing provider isn't retried in lockstep
+            next_attempt_at=datetime.now() + timedelta(seconds=delay * uniform(0.5, 1)),
+        )
+
+    async def _purge(self):
+        now = datetime.now()
+        cutoff = now - timedelta(days=outbox_settings.OUTBOX_RETENTION_DAYS)
+        expired = (
+            select(Notification.id)
+            .where(
+                Notification.status.in_((NotificationStatus.sent, NotificationStatus.dead)),
+                Notification.created_at < cutoff,
+            )
+            .limit(outbox_settings.OUTBOX_PURGE_BATCH)
+            .with_for_update(skip_locked=True)
+        )
+
+        try:
+            # Codes are useless past their TTL and must not outlive it in
+            # rows that never went out
+            async with async_session() as session:
+                await session.execute(
+                    update(Notification)
+                    .where(
+                        Notification.status == NotificationStatus.pending,
+                        Notification.created_at
+                        < now - timedelta(seconds=security_settings.VERIFICATION_CODE_TTL),
+                    )
+                    .values(
+                        status=NotificationStatus.dead,
+                        payload=Notification.payload.op("-")(
+                            postgresql.array(_CONTENT_FIELDS, type_=TEXT)
+                        ),
+                        last_error="Expired before it could be sent",
+                    )
+                )
+                await session.commit()
+
+            # Batches keep each transaction and its locks short
+            while True:
+                async with async_session() as session:
+                    result = await session.execute(
+                        delete(Notification).where(Notification.id.in_(expired))
+                    )
+                    await session.commit()
+
+                if result.rowcount < outbox_settings.OUTBOX_PURGE_BATCH:
+                    return
+        except Exception:
+            logger.exception("Could not purge the outbox")
+
+    async def _record(self, id: UUID, fallback: dict | None = None, **values):
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(Notification).where(Notification.id == id).values(**values)
+                )
+                if fallback is not None:
+                    session.add(
+                        Notification(channel=NotificationChannel.email, payload=fallback)
+                    )
+                await session.commit()
+        except Exception:
+            # The lease runs out and the row is retried
+            logger.exception("Could not record outbox notification %s", id)
@@ -0,0 +1,122 @@
+import asyncio
+from contextlib import asynccontextmanager
+from email.headerregistry import Address
+from email.message import EmailMessage
+
+import aiosmtplib
+import certifi
+import httpx
+
+from app.config.config import notification_settings
+from app.utils.templates import template_env
+
+TWILIO_MESSAGES_URL = "https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json"
+
+
+class SmtpPool:
+    """Persistent SMTP connections, opened on first use and reused across
+    sends. A connection that fails mid-send is dropped and reopened."""
+
+    def __init__(self, size: int):
+        self._idle: asyncio.Queue[aiosmtplib.SMTP] = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(self._connection())
+
+    def _connection(self) -> aiosmtplib.SMTP:
+        settings = notification_settings
+        credentials = (
+            {"username": settings.MAIL_USERNAME, "password": settings.MAIL_PASSWORD}
+            if settings.USE_CREDENTIALS else {}
+        )
+
+        return aiosmtplib.SMTP(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            use_tls=settings.MAIL_SSL_TLS,
+            start_tls=settings.MAIL_STARTTLS,
+            validate_certs=settings.VALIDATE_CERTS,
+            cert_bundle=certifi.where(),
+            timeout=settings.MAIL_TIMEOUT,
+            **credentials,
+        )
+
+    @asynccontextmanager
+    async def connection(self):
+        smtp = await self._idle.get()
+
+        try:
+            if not smtp.is_connected:
+                await smtp.connect()
+            yield smtp
+        except BaseException:
+            smtp.close()
+            raise
+        finally:
+            self._idle.put_nowait(smtp)
+
+    async def close(self):
+        while not self._idle.empty():
+            smtp = self._idle.get_nowait()
+            if smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+
+
+class EmailTransport:
+    def __init__(self, pool: SmtpPool):
+        self.pool = pool
+        self.sender = Address(
+            display_name=notification_settings.MAIL_FROM_NAME,
+            addr_spec=notification_settings.MAIL_FROM,
+        )
+
+    async def send(self, payload: dict):
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = ", ".join(payload["recipients"])
+        message["Subject"] = payload["subject"]
+
+        if "template_name" in payload:
+            html = template_env.get_template(payload["template_name"]).render(
+                payload["context"]
+            )
+            message.set_content(html, subtype="html")
+        else:
+            message.set_content(payload["body"])
+
+        async with self.pool.connection() as smtp:
+            await smtp.send_message(message)
+
+
+class SmsTransport:
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.url = notification_settings.SMS_API_URL or TWILIO_MESSAGES_URL.format(
+            sid=notification_settings.TWILIO_SID
+        )
+
+    async def send(self, payload: dict):
+        response = await self.client.post(
+            self.url,
+            data={
+                "From": notification_settings.TWILIO_NUMBER,
+                "To": payload["to"],
+                "Body": payload["body"],
+            },
+            auth=(
+                notification_settings.TWILIO_SID,
+                notification_settings.TWILIO_AUTH_TOKEN,
+            ),
+        )
+        response.raise_for_status()
+
+
+def sms_client() -> httpx.AsyncClient:
+    # Keep-alive connections to the SMS provider, shared by every send
+    return httpx.AsyncClient(
+        timeout=notification_settings.SMS_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=notification_settings.SMS_POOL_SIZE),
+        verify=certifi.where(),
+    )
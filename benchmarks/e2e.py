@@ -0,0 +1,469 @@
+"""End-to-end benchmark of the main flows against local infrastructure.
+
+    docker compose up -d db redis
+    python -m benchmarks.e2e --concurrency 32 --shipments 500 --output results.json
+
+Boots app.main:app and the outbox worker as subprocesses, with the SMTP
+sink and the SMS stub from app.stubs running in this process, then drives
+seller/partner signup and login, POST /shipment/, partner PATCH /shipment/
+scans, GET /shipment/, /shipment/track and the seller and partner shipment
+lists. Every phase reports throughput, p50/p95/p99 latency and queries per
+request, and the run is written as JSON to diff between versions.
+
+The app runs with QUERY_STATS and QUERY_BUDGETS_ENFORCED. Queries per
+request are read from the x-query-count headers, and every phase on a
+route with a query_budget is checked against it.
+
+The capacity phase fires parallel submissions at one zip code served by a
+few small partners and checks that no partner ends up over
+max_handling_capacity, and that every partner's active_shipment_count
+matches its open shipments.
+
+Settings come from the environment / .env like the app itself. Everything
+is created under a fresh run id, nothing is cleaned up.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from math import ceil
+from pathlib import Path
+from random import randint
+from statistics import quantiles
+from time import perf_counter
+from uuid import uuid4
+
+import httpx
+import uvicorn
+from sqlalchemy import text
+
+from fastapi.routing import APIRoute
+
+from app.database.session import engine
+from app.main import app
+from app.stubs import smtp_sink
+from app.stubs import sms as sms_stub
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# (method, path) -> most statements the route may run
+QUERY_BUDGETS = {
+    (method, route.path): route.endpoint.query_budget
+    for route in app.routes
+    if isinstance(route, APIRoute) and hasattr(route.endpoint, "query_budget")
+    for method in route.methods
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _summary(latencies: list[float]) -> dict:
+    if len(latencies) < 2:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+    cuts = quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+    }
+
+
+Call = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.run_id = uuid4().hex[:8]
+        self.zip_code = randint(100_000, 999_999)
+        self.app_port = _free_port()
+        self.smtp_port = _free_port()
+        self.sms_port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.app_port}"
+        self.processes: list[subprocess.Popen] = []
+        self.tasks: list[asyncio.Task] = []
+        self.results: dict = {"phases": {}, "checks": {}}
+
+    # Infrastructure
+
+    def _env(self) -> dict:
+        env = dict(os.environ)
+        env.update({
+            "MAIL_SERVER": "127.0.0.1",
+            "MAIL_PORT": str(self.smtp_port),
+            "MAIL_STARTTLS": "false",
+            "MAIL_SSL_TLS": "false",
+            "USE_CREDENTIALS": "false",
+            "SMS_API_URL": f"http://127.0.0.1:{self.sms_port}/Messages.json",
+            # Every simulated client shares one IP
+            "RATE_LIMIT_ENABLED": "false",
+            "QUERY_STATS": "true",
+            "QUERY_BUDGETS_ENFORCED": "true",
+        })
+        if self.args.hash_rounds:
+            env["PASSWORD_HASH_ROUNDS"] = str(self.args.hash_rounds)
+        return env
+
+    async def start(self):
+        self.tasks.append(asyncio.create_task(smtp_sink.serve("127.0.0.1", self.smtp_port)))
+
+        sms_server = uvicorn.Server(
+            uvicorn.Config(sms_stub.app, port=self.sms_port, log_level="warning")
+        )
+        self.tasks.append(asyncio.create_task(sms_server.serve()))
+
+        env = self._env()
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--port", str(self.app_port), "--log-level", "warning",
+             "--workers", str(self.args.workers)],
+            cwd=ROOT, env=env,
+        ))
+        if not self.args.no_worker:
+            self.processes.append(subprocess.Popen(
+                [sys.executable, "-m", "app.worker"], cwd=ROOT, env=env,
+            ))
+
+        async with httpx.AsyncClient(base_url=self.base_url) as client:
+            for _ in range(300):
+                try:
+                    if (await client.get("/health/db-pool")).status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+
+        raise RuntimeError("The app did not come up within 30s")
+
+    async def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait(timeout=10)
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        await engine.dispose()
+
+    # Measurement
+
+    async def phase(
+        self,
+        client: httpx.AsyncClient,
+        name: str,
+        calls: list[Call],
+        expected: tuple[int, ...] = (200, 201),
+        route: tuple[str, str] | None = None,
+    ) -> list[httpx.Response]:
+        slots = asyncio.Semaphore(self.args.concurrency)
+        latencies: list[float] = []
+        statuses: Counter = Counter()
+
+        async def timed(call: Call) -> httpx.Response:
+            async with slots:
+                start = perf_counter()
+                response = await call(client)
+                latencies.append(perf_counter() - start)
+                statuses[response.status_code] += 1
+                return response
+
+        start = perf_counter()
+        responses = await asyncio.gather(*(timed(call) for call in calls))
+        elapsed = perf_counter() - start
+
+        queries = [int(response.headers.get("x-query-count", 0)) for response in responses]
+
+        errors = sum(count for code, count in statuses.items() if code not in expected)
+        report = {
+            "requests": len(calls),
+            "errors": errors,
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(len(calls) / elapsed, 1) if elapsed else None,
+            **_summary(latencies),
+            "queries_per_request": round(sum(queries) / len(calls), 2) if calls else None,
+            "max_queries": max(queries, default=None),
+        }
+        self.results["phases"][name] = report
+
+        if route in QUERY_BUDGETS:
+            over = sum(count > QUERY_BUDGETS[route] for count in queries)
+            self.results["checks"].setdefault("query_budgets", {"passed": True})
+            self.results["checks"]["query_budgets"][name] = {
+                "budget": QUERY_BUDGETS[route], "over_budget": over,
+            }
+            if over:
+                self.results["checks"]["query_budgets"]["passed"] = False
+
+        print(
+            f"{name:<18} {report['requests']:>6} req {report['throughput_rps'] or 0:>8} rps  "
+            f"p50 {report['p50_ms']} ms  p95 {report['p95_ms']} ms  p99 {report['p99_ms']} ms  "
+            f"q/req {report['queries_per_request']}  errors {errors}"
+        )
+        return responses
+
+    # Flows
+
+    async def _verify_emails(self, table: str):
+        async with engine.begin() as connection:
+            await connection.execute(
+                text(f"UPDATE {table} SET email_verified = true WHERE email LIKE :pattern"),
+                {"pattern": f"bench-{self.run_id}-%"},
+            )
+
+    async def _signup_and_login(
+        self, client: httpx.AsyncClient, kind: str, accounts: list[dict]
+    ) -> list[str]:
+        prefix = "/seller" if kind == "seller" else "/partner"
+        table = "seller" if kind == "seller" else "delivery_partner"
+
+        await self.phase(client, f"{kind}_signup", [
+            lambda client, account=account: client.post(f"{prefix}/signup", json=account)
+            for account in accounts
+        ])
+        await self._verify_emails(table)
+
+        responses = await self.phase(client, f"{kind}_login", [
+            lambda client, account=account: client.post(
+                f"{prefix}/token",
+                data={"username": account["email"], "password": account["password"]},
+            )
+            for account in accounts
+        ])
+        return [response.json().get("access_token") for response in responses]
+
+    def _partner(self, index: int, zip_code: int, capacity: int, tag: str) -> dict:
+        return {
+            "name": f"Partner {index}",
+            "email": f"bench-{self.run_id}-{tag}-partner-{index}@example.com",
+            "password": "benchmark",
+            "serviceable_zip_codes": [zip_code],
+            "max_handling_capacity": capacity,
+        }
+
+    def _shipment(self, zip_code: int, index: int) -> dict:
+        return {
+            "content": "books",
+            "weight": 1.5,
+            "destination": zip_code,
+            "client_contact_email": f"client-{index}@example.com",
+            "client_contact_phone": None,
+        }
+
+    async def run(self):
+        args = self.args
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=60) as client:
+            sellers = [
+                {
+                    "name": f"Seller {i}",
+                    "email": f"bench-{self.run_id}-seller-{i}@example.com",
+                    "password": "benchmark",
+                    "address": "1 Benchmark Street",
+                    "zip_code": self.zip_code,
+                }
+                for i in range(args.sellers)
+            ]
+            seller_tokens = await self._signup_and_login(client, "seller", sellers)
+
+            capacity = ceil(args.shipments / args.partners) + 1
+            partners = [
+                self._partner(i, self.zip_code, capacity, "main") for i in range(args.partners)
+            ]
+            partner_tokens = await self._signup_and_login(client, "partner", partners)
+            partner_token_by_email = dict(zip((p["email"] for p in partners), partner_tokens))
+
+            responses = await self.phase(client, "shipment_create", [
+                lambda client, i=i: client.post(
+                    "/shipment/",
+                    json=self._shipment(self.zip_code, i),
+                    headers={"Authorization": f"Bearer {seller_tokens[i % len(seller_tokens)]}"},
+                )
+                for i in range(args.shipments)
+            ])
+            shipment_ids = [
+                response.json()["id"] for response in responses if response.status_code == 201
+            ]
+
+            async with engine.connect() as connection:
+                assigned = dict((await connection.execute(text("""
+                    SELECT shipment.id::text, delivery_partner.email
+                    FROM shipment
+                    JOIN delivery_partner ON delivery_partner.id = shipment.delivery_partner_id
+                    WHERE shipment.id = ANY(CAST(:ids AS uuid[]))
+                """), {"ids": shipment_ids})).all())
+
+            for scan in range(args.scans):
+                await self.phase(client, f"shipment_scan_{scan + 1}", [
+                    lambda client, id=id, scan=scan: client.patch(
+                        "/shipment/",
+                        params={"id": id},
+                        json={"location": self.zip_code + scan + 1, "status": "in_transit"},
+                        headers={"Authorization": f"Bearer {partner_token_by_email[assigned[id]]}"},
+                    )
+                    for id in shipment_ids
+                ])
+
+            reads = [shipment_ids[i % len(shipment_ids)] for i in range(args.reads)] if shipment_ids else []
+            await self.phase(client, "shipment_get", [
+                lambda client, id=id: client.get("/shipment/", params={"id": id}) for id in reads
+            ], route=("GET", "/shipment/"))
+            await self.phase(client, "shipment_track", [
+                lambda client, id=id: client.get("/shipment/track", params={"id": id}) for id in reads
+            ], route=("GET", "/shipment/track"))
+            await self.phase(client, "seller_shipments", [
+                lambda client, i=i: client.get(
+                    "/seller/shipments",
+                    headers={"Authorization": f"Bearer {seller_tokens[i % len(seller_tokens)]}"},
+                )
+                for i in range(args.reads)
+            ], route=("GET", "/seller/shipments"))
+            await self.phase(client, "partner_shipments", [
+                lambda client, i=i: client.get(
+                    "/partner/shipments",
+                    headers={"Authorization": f"Bearer {partner_tokens[i % len(partner_tokens)]}"},
+                )
+                for i in range(args.reads)
+            ], route=("GET", "/partner/shipments"))
+
+            await self.capacity(client, seller_tokens)
+
+        await self.check_counters()
+
+        if not args.no_worker:
+            # Give the outbox a moment to drain before counting deliveries
+            await asyncio.sleep(args.drain)
+            self.results["checks"]["notifications"] = {
+                "emails_received": smtp_sink.received,
+                "sms_received": len(sms_stub.messages),
+            }
+
+    async def capacity(self, client: httpx.AsyncClient, seller_tokens: list[str]):
+        args = self.args
+        zip_code = self.zip_code + 500_000
+        partners = [
+            self._partner(i, zip_code, args.capacity_per_partner, "capacity")
+            for i in range(args.capacity_partners)
+        ]
+        await self._signup_and_login(client, "capacity_partner", partners)
+
+        total_capacity = args.capacity_per_partner * args.capacity_partners
+        submissions = total_capacity * 3
+
+        responses = await self.phase(client, "capacity_contention", [
+            lambda client, i=i: client.post(
+                "/shipment/",
+                json=self._shipment(zip_code, i),
+                headers={"Authorization": f"Bearer {seller_tokens[i % len(seller_tokens)]}"},
+            )
+            for i in range(submissions)
+        ], expected=(201, 406))
+
+        accepted = sum(response.status_code == 201 for response in responses)
+
+        async with engine.connect() as connection:
+            over = (await connection.execute(text("""
+                SELECT count(*) FROM delivery_partner
+                WHERE email LIKE :pattern AND active_shipment_count > max_handling_capacity
+            """), {"pattern": f"bench-{self.run_id}-capacity-%"})).scalar_one()
+
+        self.results["checks"]["capacity"] = {
+            "submissions": submissions,
+            "total_capacity": total_capacity,
+            "accepted": accepted,
+            "partners_over_capacity": over,
+            "passed": accepted == total_capacity and over == 0,
+        }
+
+    async def check_counters(self):
+        # The maintained counter against the shipments it stands for
+        async with engine.connect() as connection:
+            mismatched = (await connection.execute(text("""
+                SELECT count(*) FROM delivery_partner AS partner
+                WHERE partner.email LIKE :pattern
+                AND partner.active_shipment_count <> (
+                    SELECT count(*) FROM shipment
+                    WHERE shipment.delivery_partner_id = partner.id
+                    AND shipment.current_status NOT IN ('delivered', 'cancelled')
+                )
+            """), {"pattern": f"bench-{self.run_id}-%"})).scalar_one()
+
+        self.results["checks"]["active_shipment_counters"] = {
+            "mismatched_partners": mismatched,
+            "passed": mismatched == 0,
+        }
+
+    def report(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "revision": _git_revision(),
+            "started_at": datetime.now().isoformat(),
+            "settings": {
+                key: value for key, value in vars(self.args).items() if key != "output"
+            },
+            **self.results,
+        }
+
+
+async def main(args: argparse.Namespace):
+    benchmark = Benchmark(args)
+    await benchmark.start()
+
+    try:
+        await benchmark.run()
+    finally:
+        await benchmark.stop()
+
+    report = benchmark.report()
+    for name, check in report["checks"].items():
+        print(f"{name}: {check}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"results written to {args.output}")
+
+    failed = [name for name, check in report["checks"].items() if check.get("passed") is False]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sellers", type=int, default=20)
+    parser.add_argument("--partners", type=int, default=10)
+    parser.add_argument("--shipments", type=int, default=500)
+    parser.add_argument("--scans", type=int, default=2, help="status scans per shipment")
+    parser.add_argument("--reads", type=int, default=2000, help="requests for each read endpoint")
+    parser.add_argument("--capacity-partners", type=int, default=5)
+    parser.add_argument("--capacity-per-partner", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--hash-rounds", type=int, default=None, help="override PASSWORD_HASH_ROUNDS")
+    parser.add_argument("--no-worker", action="store_true", help="don't run the outbox worker")
+    parser.add_argument("--drain", type=float, default=5, help="seconds to let the outbox drain")
+    parser.add_argument("--output", default=None, help="JSON results file")
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
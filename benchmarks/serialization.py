@@ -0,0 +1,86 @@
+"""Serialization cost of a shipment with 50 timeline events: ORM objects
+validated into ShipmentRead and encoded by JSONResponse (the old path)
+against ShipmentView built from row tuples and encoded by ORJSONResponse.
+
+    python -m benchmarks.serialization [--events 50] [--iterations 2000]
+"""
+import argparse
+from datetime import datetime, timedelta
+from time import perf_counter
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+from app.api.schemas.shipment import ShipmentEventView, ShipmentRead, ShipmentView
+from app.database.models import Shipment, ShipmentEvent, ShipmentStatus
+
+
+def _shipment(events: int) -> Shipment:
+    shipment = Shipment(
+        id=uuid4(),
+        content="books",
+        weight=2.5,
+        destination=11001,
+        estimated_delivery=datetime.now() + timedelta(days=3),
+        client_contact_email="client@example.com",
+        client_contact_phone=None,
+        seller_id=uuid4(),
+        delivery_partner_id=uuid4(),
+    )
+    shipment.timeline = [
+        ShipmentEvent(
+            id=uuid4(),
+            created_at=datetime.now() + timedelta(minutes=i),
+            location=11000 + i,
+            status=ShipmentStatus.in_transit,
+            description=f"scanned at {11000 + i}",
+            shipment_id=shipment.id,
+        )
+        for i in range(events)
+    ]
+    return shipment
+
+
+def _per_call(call, iterations: int) -> float:
+    start = perf_counter()
+    for _ in range(iterations):
+        call()
+    return (perf_counter() - start) / iterations * 1e6
+
+
+def main(events: int, iterations: int):
+    shipment = _shipment(events)
+    adapter = TypeAdapter(ShipmentRead)
+
+    # What the database returns for ShipmentView.columns / ShipmentEventView.columns
+    shipment_row = tuple(getattr(shipment, column.key) for column in ShipmentView.columns)
+    event_rows = [
+        tuple(getattr(event, column.key) for column in ShipmentEventView.columns)
+        for event in shipment.timeline
+    ]
+
+    def before():
+        # FastAPI's response_model path
+        read = adapter.validate_python(shipment, from_attributes=True)
+        return JSONResponse(adapter.dump_python(read, mode="json")).body
+
+    def after():
+        return ORJSONResponse(ShipmentView.from_rows(shipment_row, event_rows)).body
+
+    assert len(before()) > 0 and len(after()) > 0
+
+    old = _per_call(before, iterations)
+    new = _per_call(after, iterations)
+
+    print(f"shipment with {events} events, {iterations} iterations")
+    print(f"ShipmentRead + JSONResponse     {old:>8.1f} us")
+    print(f"ShipmentView + ORJSONResponse   {new:>8.1f} us  ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.events, args.iterations)
@@ -0,0 +1,74 @@
+"""Render time per template: a fresh environment per render (what building
+Jinja2Templates / FastMail per call costs) against the shared precompiled
+environment.
+
+    python -m benchmarks.templates [--iterations 2000]
+"""
+import argparse
+from datetime import datetime
+from time import perf_counter
+from types import SimpleNamespace
+from uuid import uuid4
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from app.database.models import ShipmentStatus
+from app.utils.email_util import TEMPLATE_DIR
+from app.utils.templates import precompile_templates, template_env
+
+CONTEXT = {
+    "id": uuid4(),
+    "seller": "Acme",
+    "partner": "Speedy",
+    "username": "Jane",
+    "verification_code": 123456,
+    "verification_url": "http://localhost:8000/seller/verify?token=x",
+    "reset_url": "http://localhost:8000/seller/reset_password?token=x",
+    "content": "books",
+    "status": "in_transit",
+    "created_at": datetime.now(),
+    "estimated_delivery": datetime.now(),
+    "timeline": [
+        SimpleNamespace(
+            location=11000 + i,
+            status=ShipmentStatus.in_transit,
+            description=f"scanned at {11000 + i}",
+            created_at=datetime.now(),
+        )
+        for i in range(10)
+    ],
+    "url_for": lambda *args, **kwargs: "",
+}
+
+
+def _per_render(render, iterations: int) -> float:
+    start = perf_counter()
+    for _ in range(iterations):
+        render()
+    return (perf_counter() - start) / iterations * 1e6
+
+
+def main(iterations: int):
+    start = perf_counter()
+    names = precompile_templates()
+    print(f"precompiled {len(names)} templates in {(perf_counter() - start) * 1e3:.1f} ms\n")
+
+    print(f"{'template':<40} {'fresh env (us)':>15} {'shared (us)':>12} {'speedup':>8}")
+    for name in names:
+        def fresh():
+            Environment(
+                loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape()
+            ).get_template(name).render(CONTEXT)
+
+        def shared():
+            template_env.get_template(name).render(CONTEXT)
+
+        cold = _per_render(fresh, max(1, iterations // 20))
+        warm = _per_render(shared, iterations)
+        print(f"{name:<40} {cold:>15.1f} {warm:>12.1f} {cold / warm:>7.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    main(parser.parse_args().iterations)
@@ -0,0 +1,29 @@
+"""add partner zip code index
+
+Revision ID: 3b9e1f6c84a2
+Revises: ccb65f5a2d7f
+Create Date: 2026-10-18 10:03:17.552810
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlmodel
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9e1f6c84a2'
+down_revision: Union[str, Sequence[str], None] = 'ccb65f5a2d7f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_delivery_partner_serviceable_zip_codes', 'delivery_partner', ['serviceable_zip_codes'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_delivery_partner_serviceable_zip_codes', table_name='delivery_partner', postgresql_using='gin')
@@ -0,0 +1,52 @@
+"""materialize shipment current status
+
+Revision ID: 5e0c27d9a1f3
+Revises: 3b9e1f6c84a2
+Create Date: 2026-10-18 11:26:40.917302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlmodel
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0c27d9a1f3'
+down_revision: Union[str, Sequence[str], None] = '3b9e1f6c84a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('shipment', sa.Column('current_status', postgresql.ENUM(name="shipmentstatus", create_type=False), nullable=True))
+    op.add_column('shipment', sa.Column('current_location', sa.Integer(), nullable=True))
+    op.add_column('shipment', sa.Column('last_event_at', postgresql.TIMESTAMP(), nullable=True))
+
+    # Backfill from the latest event of every shipment
+    op.execute("""
+        UPDATE shipment
+        SET current_status = latest.status,
+            current_location = latest.location,
+            last_event_at = latest.created_at
+        FROM (
+            SELECT DISTINCT ON (shipment_id) shipment_id, status, location, created_at
+            FROM shipment_event
+            ORDER BY shipment_id, created_at DESC
+        ) AS latest
+        WHERE shipment.id = latest.shipment_id
+    """)
+
+    op.create_index('ix_shipment_delivery_partner_id_current_status', 'shipment', ['delivery_partner_id', 'current_status'], unique=False)
+    op.create_index('ix_shipment_seller_id_current_status', 'shipment', ['seller_id', 'current_status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shipment_seller_id_current_status', table_name='shipment')
+    op.drop_index('ix_shipment_delivery_partner_id_current_status', table_name='shipment')
+    op.drop_column('shipment', 'last_event_at')
+    op.drop_column('shipment', 'current_location')
+    op.drop_column('shipment', 'current_status')
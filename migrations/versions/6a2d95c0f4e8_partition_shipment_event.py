@@ -0,0 +1,109 @@
+"""partition shipment event
+
+Revision ID: 6a2d95c0f4e8
+Revises: 1c6f4e92b8d3
+Create Date: 2026-10-18 15:22:48.730165
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlmodel
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '6a2d95c0f4e8'
+down_revision: Union[str, Sequence[str], None] = '1c6f4e92b8d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_shipment_event(**kwargs) -> None:
+    op.create_table('shipment_event',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('created_at', postgresql.TIMESTAMP(), nullable=False),
+    sa.Column('location', sa.Integer(), nullable=False),
+    sa.Column('status', postgresql.ENUM(name="shipmentstatus", create_type=False), nullable=False),
+    sa.Column('description', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('shipment_id', sa.Uuid(), nullable=False),
+    sa.ForeignKeyConstraint(['shipment_id'], ['shipment.id'], ),
+    **kwargs
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.rename_table('shipment_event', 'shipment_event_legacy')
+    op.execute("ALTER INDEX shipment_event_pkey RENAME TO shipment_event_legacy_pkey")
+
+    # The partition key can't be null, and timelines are now read from the
+    # shipment's created_at on, so no event may predate its shipment
+    op.execute("""
+        UPDATE shipment_event_legacy AS event
+        SET created_at = shipment.created_at
+        FROM shipment
+        WHERE shipment.id = event.shipment_id AND event.created_at IS NULL
+    """)
+    op.execute("""
+        UPDATE shipment
+        SET created_at = first.created_at
+        FROM (
+            SELECT shipment_id, min(created_at) AS created_at
+            FROM shipment_event_legacy
+            GROUP BY shipment_id
+        ) AS first
+        WHERE first.shipment_id = shipment.id AND first.created_at < shipment.created_at
+    """)
+
+    _create_shipment_event(
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    op.execute("CREATE TABLE shipment_event_default PARTITION OF shipment_event DEFAULT")
+
+    # Monthly partitions from the oldest event up to three months ahead,
+    # later ones are created by app.database.partitions
+    op.execute("""
+        DO $$
+        DECLARE
+            partition_month date := date_trunc('month', coalesce(
+                (SELECT min(created_at) FROM shipment_event_legacy), now()
+            ));
+        BEGIN
+            WHILE partition_month <= date_trunc('month', now()) + interval '3 months' LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF shipment_event FOR VALUES FROM (%L) TO (%L)',
+                    'shipment_event_p' || to_char(partition_month, 'YYYYMM'),
+                    partition_month,
+                    partition_month + interval '1 month'
+                );
+                partition_month := partition_month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+
+    op.create_index('ix_shipment_event_shipment_id_created_at', 'shipment_event', ['shipment_id', 'created_at'], unique=False)
+
+    op.execute("""
+        INSERT INTO shipment_event (id, created_at, location, status, description, shipment_id)
+        SELECT id, created_at, location, status, description, shipment_id
+        FROM shipment_event_legacy
+    """)
+    op.drop_table('shipment_event_legacy')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.rename_table('shipment_event', 'shipment_event_partitioned')
+    op.execute("ALTER INDEX shipment_event_pkey RENAME TO shipment_event_partitioned_pkey")
+
+    _create_shipment_event(sa.PrimaryKeyConstraint('id'))
+    op.execute("""
+        INSERT INTO shipment_event (id, created_at, location, status, description, shipment_id)
+        SELECT id, created_at, location, status, description, shipment_id
+        FROM shipment_event_partitioned
+    """)
+
+    # Drops every partition with it
+    op.drop_table('shipment_event_partitioned')
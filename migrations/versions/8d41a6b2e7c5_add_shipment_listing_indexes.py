@@ -0,0 +1,38 @@
+"""add shipment listing indexes
+
+Revision ID: 8d41a6b2e7c5
+Revises: 5e0c27d9a1f3
+Create Date: 2026-10-18 12:41:05.233918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlmodel
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41a6b2e7c5'
+down_revision: Union[str, Sequence[str], None] = '5e0c27d9a1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("UPDATE shipment SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('shipment', 'created_at',
+               existing_type=postgresql.TIMESTAMP(),
+               nullable=False)
+    op.create_index('ix_shipment_seller_id_created_at_id', 'shipment', ['seller_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_shipment_delivery_partner_id_created_at_id', 'shipment', ['delivery_partner_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shipment_delivery_partner_id_created_at_id', table_name='shipment')
+    op.drop_index('ix_shipment_seller_id_created_at_id', table_name='shipment')
+    op.alter_column('shipment', 'created_at',
+               existing_type=postgresql.TIMESTAMP(),
+               nullable=True)
@@ -0,0 +1,33 @@
+"""add shipment updated_at
+
+Revision ID: b4f1d7c2a9e3
+Revises: 6a2d95c0f4e8
+Create Date: 2026-10-18 16:02:11.482915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlmodel
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4f1d7c2a9e3'
+down_revision: Union[str, Sequence[str], None] = '6a2d95c0f4e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('shipment', sa.Column('updated_at', postgresql.TIMESTAMP(), nullable=True))
+
+    # Estimate changes before this point are not recorded, the latest event
+    # is the best known modification time
+    op.execute("UPDATE shipment SET updated_at = COALESCE(last_event_at, created_at)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('shipment', 'updated_at')
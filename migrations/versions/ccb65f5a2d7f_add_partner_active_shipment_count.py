@@ -0,0 +1,50 @@
+"""add partner active shipment count
+
+Revision ID: ccb65f5a2d7f
+Revises: f7a38dc8bcee
+Create Date: 2026-10-18 09:12:44.108211
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlmodel
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ccb65f5a2d7f'
+down_revision: Union[str, Sequence[str], None] = 'f7a38dc8bcee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('delivery_partner', sa.Column('active_shipment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the latest event of every shipment
+    op.execute("""
+        UPDATE delivery_partner AS partner
+        SET active_shipment_count = active.total
+        FROM (
+            SELECT shipment.delivery_partner_id, count(*) AS total
+            FROM shipment
+            LEFT JOIN LATERAL (
+                SELECT status
+                FROM shipment_event
+                WHERE shipment_event.shipment_id = shipment.id
+                ORDER BY shipment_event.created_at DESC
+                LIMIT 1
+            ) AS latest ON true
+            WHERE latest.status IS NULL
+            OR latest.status NOT IN ('delivered', 'cancelled')
+            GROUP BY shipment.delivery_partner_id
+        ) AS active
+        WHERE partner.id = active.delivery_partner_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('delivery_partner', 'active_shipment_count')
@@ -0,0 +1,42 @@
+"""Integration tests, run against the Postgres and Redis configured in .env
+like the app itself. They are skipped when those cannot be reached.
+
+    python -m pytest tests
+"""
+import pytest
+from redis.exceptions import RedisError
+from sqlalchemy.exc import OperationalError
+
+from app.database.redis import disconnect, is_jti_blacklisted
+from app.database.session import create_database_tables, engine
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database():
+    try:
+        await create_database_tables()
+    except (OperationalError, OSError) as error:
+        pytest.skip(f"Postgres is not reachable: {error!r}")
+
+    yield
+
+    # Pooled connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def redis():
+    try:
+        await is_jti_blacklisted("-")
+    except (RedisError, OSError) as error:
+        await disconnect()
+        pytest.skip(f"Redis is not reachable: {error!r}")
+
+    yield
+
+    await disconnect()
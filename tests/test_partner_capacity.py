@@ -0,0 +1,181 @@
+import asyncio
+from collections import Counter
+from random import randint
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Text, cast, delete, select
+
+from app.api.schemas.shipment import ShipmentCreate
+from app.core.principal_cache import Principal
+from app.database.models import (
+    TERMINAL_STATUSES,
+    DeliveryPartner,
+    Notification,
+    Seller,
+    Shipment,
+    ShipmentEvent,
+)
+from app.database.session import async_session
+from app.database.unit_of_work import UnitOfWork
+from app.services.delivery_partner import DeliveryPartnerService
+from app.services.notification import NotificationService
+from app.services.shipment import ShipmentService
+from app.services.shipment_event import ShipmentEventService
+
+pytestmark = pytest.mark.anyio
+
+CAPACITIES = (20, 30, 50)
+SUBMISSIONS = 300
+
+
+async def _as_request(work):
+    """Runs `work` with the services of one request, like the API does"""
+    uow = UnitOfWork(async_session())
+    notifications = NotificationService(uow)
+    service = ShipmentService(
+        uow,
+        DeliveryPartnerService(uow, notifications),
+        ShipmentEventService(uow, notifications),
+    )
+    try:
+        return await work(service)
+    finally:
+        await uow.close()
+
+
+@pytest.fixture
+async def routes(database):
+    # A zip code no other data uses, the partners are the only ones serving it
+    zip_code = randint(900_000, 999_999)
+    domain = f"capacity-{uuid4().hex}.example.com"
+
+    seller = Seller(
+        id=uuid4(),
+        name="Seller",
+        email=f"seller@{domain}",
+        email_verified=True,
+        password_hash="-",
+        zip_code=zip_code,
+    )
+    partners = [
+        DeliveryPartner(
+            id=uuid4(),
+            name=f"Partner {index}",
+            email=f"partner{index}@{domain}",
+            email_verified=True,
+            password_hash="-",
+            serviceable_zip_codes=[zip_code],
+            max_handling_capacity=capacity,
+        )
+        for index, capacity in enumerate(CAPACITIES)
+    ]
+
+    async with async_session() as session:
+        session.add(seller)
+        session.add_all(partners)
+        await session.commit()
+
+    yield Principal.from_user(seller), zip_code, domain
+
+    async with async_session() as session:
+        shipment_ids = select(Shipment.id).where(Shipment.seller_id == seller.id)
+        await session.execute(
+            delete(ShipmentEvent).where(ShipmentEvent.shipment_id.in_(shipment_ids))
+        )
+        await session.execute(delete(Shipment).where(Shipment.seller_id == seller.id))
+        await session.execute(
+            delete(DeliveryPartner).where(
+                DeliveryPartner.id.in_([partner.id for partner in partners])
+            )
+        )
+        await session.execute(delete(Seller).where(Seller.id == seller.id))
+        await session.execute(
+            delete(Notification).where(cast(Notification.payload, Text).contains(domain))
+        )
+        await session.commit()
+
+
+async def _partner_counts(zip_code: int) -> dict:
+    async with async_session() as session:
+        partners = (
+            await session.scalars(
+                select(DeliveryPartner).where(
+                    DeliveryPartner.serviceable_zip_codes.contains([zip_code])
+                )
+            )
+        ).all()
+        assigned = Counter(
+            (
+                await session.scalars(
+                    select(Shipment.delivery_partner_id).where(
+                        Shipment.delivery_partner_id.in_([p.id for p in partners]),
+                        Shipment.current_status.not_in(TERMINAL_STATUSES),
+                    )
+                )
+            ).all()
+        )
+
+    return {
+        partner.id: (
+            partner.active_shipment_count,
+            assigned[partner.id],
+            partner.max_handling_capacity,
+        )
+        for partner in partners
+    }
+
+
+async def test_parallel_submissions_never_exceed_capacity(routes):
+    seller, zip_code, domain = routes
+
+    def submission(index: int) -> ShipmentCreate:
+        return ShipmentCreate(
+            content=f"Parcel {index}",
+            weight=1,
+            destination=zip_code,
+            client_contact_email=f"client{index}@{domain}",
+        )
+
+    results = await asyncio.gather(
+        *(
+            _as_request(lambda service, index=index: service.add(submission(index), seller))
+            for index in range(SUBMISSIONS)
+        ),
+        return_exceptions=True,
+    )
+
+    created = [result for result in results if isinstance(result, Shipment)]
+    rejected = [
+        result for result in results
+        if isinstance(result, HTTPException) and result.status_code == 406
+    ]
+    assert len(created) + len(rejected) == SUBMISSIONS, [
+        result for result in results if result not in created and result not in rejected
+    ]
+    assert len(created) == sum(CAPACITIES)
+
+    for count, assigned, capacity in (await _partner_counts(zip_code)).values():
+        assert count == assigned == capacity
+
+    # Every shipment cancelled twice at once: one succeeds, the other sees
+    # the final status, and each slot is released exactly once
+    cancels = await asyncio.gather(
+        *(
+            _as_request(lambda service, id=shipment.id: service.cancel(id, seller))
+            for shipment in created
+            for _ in range(2)
+        ),
+        return_exceptions=True,
+    )
+
+    assert sum(isinstance(result, Shipment) for result in cancels) == len(created)
+    assert all(
+        isinstance(result, Shipment)
+        or (isinstance(result, HTTPException) and result.status_code == 409)
+        for result in cancels
+    )
+
+    for count, assigned, _ in (await _partner_counts(zip_code)).values():
+        assert count == assigned == 0
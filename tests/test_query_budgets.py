@@ -0,0 +1,140 @@
+from random import randint
+from uuid import uuid4
+
+import pytest
+from fastapi.routing import APIRoute
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import Text, cast, delete, select
+
+from app.api.middleware import QueryStatsMiddleware
+from app.database.models import (
+    DeliveryPartner,
+    Notification,
+    Seller,
+    Shipment,
+    ShipmentEvent,
+)
+from app.database.query_stats import QueryBudgetExceeded
+from app.database.session import async_session
+from app.main import app
+from app.utils.jwt_token import generate_access_token
+
+pytestmark = pytest.mark.anyio
+
+# The app as run with QUERY_BUDGETS_ENFORCED, a route over its budget
+# raises instead of answering
+enforced_app = QueryStatsMiddleware(app, headers=True, enforce_budgets=True)
+
+
+def _budgeted_routes() -> dict[tuple[str, str], APIRoute]:
+    return {
+        (method, route.path): route
+        for route in app.routes
+        if isinstance(route, APIRoute) and hasattr(route.endpoint, "query_budget")
+        for method in route.methods
+    }
+
+
+def _token(user: Seller | DeliveryPartner) -> str:
+    return generate_access_token(data={"user": {"name": user.name, "id": str(user.id)}})
+
+
+@pytest.fixture
+async def client(database, redis):
+    zip_code = randint(900_000, 999_999)
+    domain = f"budget-{uuid4().hex}.example.com"
+
+    seller = Seller(
+        id=uuid4(),
+        name="Seller",
+        email=f"seller@{domain}",
+        email_verified=True,
+        password_hash="-",
+        zip_code=zip_code,
+    )
+    partner = DeliveryPartner(
+        id=uuid4(),
+        name="Partner",
+        email=f"partner@{domain}",
+        email_verified=True,
+        password_hash="-",
+        serviceable_zip_codes=[zip_code],
+        max_handling_capacity=10,
+    )
+
+    async with async_session() as session:
+        session.add_all([seller, partner])
+        await session.commit()
+
+    async with AsyncClient(
+        transport=ASGITransport(app=enforced_app), base_url="http://test"
+    ) as client:
+        response = await client.post(
+            "/shipment/",
+            json={
+                "content": "books",
+                "weight": 1.5,
+                "destination": zip_code,
+                "client_contact_email": f"client@{domain}",
+            },
+            headers={"Authorization": f"Bearer {_token(seller)}"},
+        )
+        assert response.status_code == 201, response.text
+
+        yield client, _token(seller), _token(partner), response.json()["id"]
+
+    async with async_session() as session:
+        shipment_ids = select(Shipment.id).where(Shipment.seller_id == seller.id)
+        await session.execute(
+            delete(ShipmentEvent).where(ShipmentEvent.shipment_id.in_(shipment_ids))
+        )
+        await session.execute(delete(Shipment).where(Shipment.seller_id == seller.id))
+        await session.execute(delete(DeliveryPartner).where(DeliveryPartner.id == partner.id))
+        await session.execute(delete(Seller).where(Seller.id == seller.id))
+        await session.execute(
+            delete(Notification).where(cast(Notification.payload, Text).contains(domain))
+        )
+        await session.commit()
+
+
+def _requests(seller_token: str, partner_token: str, shipment_id: str) -> dict:
+    return {
+        ("GET", "/shipment/"): {"params": {"id": shipment_id}},
+        ("GET", "/shipment/track"): {"params": {"id": shipment_id}},
+        ("GET", "/seller/shipments"): {
+            "headers": {"Authorization": f"Bearer {seller_token}"}
+        },
+        ("GET", "/partner/shipments"): {
+            "headers": {"Authorization": f"Bearer {partner_token}"}
+        },
+    }
+
+
+async def test_budgeted_routes_stay_within_budget(client):
+    client, seller_token, partner_token, shipment_id = client
+    requests = _requests(seller_token, partner_token, shipment_id)
+    routes = _budgeted_routes()
+
+    # A newly budgeted route needs a request here
+    assert requests.keys() == routes.keys()
+
+    for (method, path), kwargs in requests.items():
+        response = await client.request(method, path, **kwargs)
+
+        assert response.status_code == 200, (path, response.text)
+        assert int(response.headers["x-query-count"]) <= routes[method, path].endpoint.query_budget
+
+        # Unchanged resources answer from the validator alone
+        if "etag" in response.headers:
+            kwargs = {**kwargs, "headers": {"If-None-Match": response.headers["etag"]}}
+            response = await client.request(method, path, **kwargs)
+            assert response.status_code == 304, path
+
+
+async def test_route_over_budget_fails(client, monkeypatch):
+    client, _, _, shipment_id = client
+    route = _budgeted_routes()["GET", "/shipment/"]
+    monkeypatch.setattr(route.endpoint, "query_budget", 0)
+
+    with pytest.raises(QueryBudgetExceeded):
+        await client.get("/shipment/", params={"id": shipment_id})